@@ -2,7 +2,8 @@
 Data collection pipeline for YouTube channels.
 """
 import logging
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Callable
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
@@ -15,14 +16,29 @@ class Collector:
         """Initialize collector with YouTube client and database."""
         self.youtube = youtube_client
         self.db = database
+        # Handle/URL -> channel ID never changes, so successful resolutions are memoized
+        self._resolved_ids = {}
     
-    def collect_channel(self, channel_input: str, mode: str = 'incremental') -> Dict:
+    def _resolve_channel_id(self, channel_input: str):
+        """Resolve a channel input via the API, reusing earlier successful resolutions."""
+        key = channel_input.strip()
+        channel_id = self._resolved_ids.get(key)
+        if channel_id is None:
+            channel_id = self.youtube.resolve_channel_id(key)
+            if channel_id:
+                self._resolved_ids[key] = channel_id
+        return channel_id
+    
+    def collect_channel(self, channel_input: str, mode: str = 'incremental',
+                        metadata: Optional[Dict] = None) -> Dict:
         """
         Collect data for a single channel.
         
         Args:
             channel_input: Channel ID, handle, or URL
             mode: 'incremental' (only new videos) or 'full' (all videos)
+            metadata: Channel metadata already fetched in a batch (see collect_channels);
+                      fetched here when omitted
         
         Returns:
             Dict with collection statistics
@@ -30,13 +46,14 @@ class Collector:
         logger.info(f"Starting collection for: {channel_input} (mode: {mode})")
         
         # Step 1: Resolve channel ID
-        channel_id = self.youtube.resolve_channel_id(channel_input)
+        channel_id = self._resolve_channel_id(channel_input)
         if not channel_id:
             logger.error(f"Could not resolve channel ID for: {channel_input}")
             return {'status': 'error', 'message': 'Invalid channel input'}
         
-        # Step 2: Get channel metadata
-        metadata = self.youtube.get_channel_metadata(channel_id)
+        # Step 2: Get channel metadata (unless prefetched in a batch)
+        if metadata is None:
+            metadata = self.youtube.get_channel_metadata(channel_id)
         if not metadata:
             logger.error(f"Could not get metadata for channel: {channel_id}")
             return {'status': 'error', 'message': 'Channel not found'}
@@ -50,9 +67,12 @@ class Collector:
             uploads_playlist_id=metadata['uploads_playlist_id']
         )
         
-        # Step 3: Get all video IDs from uploads playlist
+        # Step 3: Get video IDs from uploads playlist
         logger.info(f"Fetching video IDs for: {metadata['title']}")
-        video_ids = self.youtube.get_all_video_ids(metadata['uploads_playlist_id'])
+        if mode == 'incremental':
+            video_ids = self._get_recent_video_ids(channel_id, metadata['uploads_playlist_id'])
+        else:
+            video_ids = self.youtube.get_all_video_ids(metadata['uploads_playlist_id'])
         
         if not video_ids:
             logger.warning(f"No videos found for channel: {metadata['title']}")
@@ -65,52 +85,19 @@ class Collector:
             }
         
         # Step 4: Determine which videos to fetch details for
-        existing_video_ids = self.db.get_existing_video_ids(channel_id)
-        new_video_ids = [vid for vid in video_ids if vid not in existing_video_ids]
+        new_video_ids = self.db.get_new_video_ids(channel_id, video_ids)
         
-        logger.info(f"Found {len(video_ids)} total videos, {len(new_video_ids)} new, {len(existing_video_ids)} existing")
+        logger.info(f"Found {len(video_ids)} total videos, {len(new_video_ids)} new, {len(video_ids) - len(new_video_ids)} existing")
         
         # Step 5: Fetch video details with improved incremental strategy
-        videos_to_fetch = []
-        
         if mode == 'incremental':
-            # Fetch new videos
-            videos_to_fetch = new_video_ids
-            
-            # Also refresh some existing videos:
-            # - Recent videos (published in last 90 days) - views still growing
-            # - 10% rotation of older videos to keep ranking accurate
-            cursor = self.db.conn.cursor()
-            
-            # Get recent videos (last 90 days)
-            cursor.execute("""
-                SELECT video_id FROM videos
-                WHERE channel_id = ? 
-                  AND published_at >= date('now', '-90 days')
-                ORDER BY published_at DESC
-            """, (channel_id,))
-            recent_videos = [row[0] for row in cursor.fetchall()]
+            # New videos + recent (90 days) + 10% rotation of older ones, deduplicated in SQL
+            videos_to_fetch = self.db.get_incremental_video_ids(channel_id, new_video_ids)
             
-            # Get 10% of older videos for rotation (random sample)
-            cursor.execute("""
-                SELECT video_id FROM videos
-                WHERE channel_id = ?
-                  AND published_at < date('now', '-90 days')
-                ORDER BY RANDOM()
-                LIMIT (SELECT MAX(1, COUNT(*) / 10) FROM videos 
-                       WHERE channel_id = ? 
-                       AND published_at < date('now', '-90 days'))
-            """, (channel_id, channel_id))
-            rotation_videos = [row[0] for row in cursor.fetchall()]
-            
-            # Combine
-            videos_to_fetch.extend(recent_videos)
-            videos_to_fetch.extend(rotation_videos)
-            videos_to_fetch = list(set(videos_to_fetch))  # Remove duplicates
-            
-            logger.info(f"Incremental mode: {len(new_video_ids)} new + {len(recent_videos)} recent + {len(rotation_videos)} rotation = {len(videos_to_fetch)} to fetch")
+            logger.info(f"Incremental mode: {len(new_video_ids)} new + {len(videos_to_fetch) - len(new_video_ids)} recent/rotation = {len(videos_to_fetch)} to fetch")
         else:  # full mode
-            videos_to_fetch = video_ids
+            # Dedup where the list is created (order-preserving)
+            videos_to_fetch = list(dict.fromkeys(video_ids))
         
         if not videos_to_fetch:
             logger.info("No videos to fetch")
@@ -139,62 +126,111 @@ class Collector:
             self.db.upsert_videos(video_details)
             logger.info(f"Saved {len(video_details)}/{len(videos_to_fetch)} videos (some may have been skipped due to missing data)")
         
-        # Step 7: Create snapshot with reported channel views
-        self.db.create_snapshot(
+        # Step 7: Create snapshot with reported channel views (returns the aggregated stats)
+        stats = self.db.create_snapshot(
             channel_id,
             reported_channel_views=metadata.get('view_count')
         )
         
-        stats = self.db.get_channel_stats(channel_id)
-        
         logger.info(f"Collection complete for {metadata['title']}: {stats['total_videos']} videos, {stats['total_views']:,} total views")
         
+        details_ids = {vd['video_id'] for vd in video_details}
+        
         return {
             'status': 'success',
             'channel_id': channel_id,
             'title': metadata['title'],
             'videos_collected': len(video_details),
-            'new_videos': len([v for v in new_video_ids if v in [vd['video_id'] for vd in video_details]]),
+            'new_videos': sum(1 for v in new_video_ids if v in details_ids),
             'total_views': stats['total_views'],
             'shorts_views': stats['shorts_views'],
             'total_videos': stats['total_videos']
         }
     
-    def collect_channels(self, channel_inputs: List[str], mode: str = 'incremental') -> List[Dict]:
+    def _get_recent_video_ids(self, channel_id: str, uploads_playlist_id: str) -> List[str]:
+        """
+        Page through the uploads playlist (newest first) until a page adds no new videos.
+        
+        Inactive channels then cost a single playlistItems request instead of one per
+        50 uploads. Older stored videos are still refreshed by the rotation sample.
+        """
+        video_ids = []
+        for page_count, page in enumerate(self.youtube.iter_video_id_pages(uploads_playlist_id), 1):
+            video_ids.extend(page)
+            if not self.db.get_new_video_ids(channel_id, page):
+                logger.info(f"Page {page_count} has no new videos, stopping playlist scan")
+                break
+        return video_ids
+    
+    def collect_channels(self, channel_inputs: List[str], mode: str = 'incremental',
+                         max_workers: int = 8,
+                         progress_callback: Optional[Callable[[int, int], None]] = None) -> List[Dict]:
         """
         Collect data for multiple channels.
         
+        Channels are collected concurrently: the work is dominated by YouTube API
+        latency, while database writes are serialized by the Database lock.
+        
         Args:
             channel_inputs: List of channel IDs, handles, or URLs
             mode: 'incremental' or 'full'
+            max_workers: Number of channels collected in parallel
+            progress_callback: Optional callable(done, total), called from the calling
+                               thread as each channel finishes (e.g. to drive a progress bar)
         
         Returns:
-            List of collection results
+            List of collection results, in the same order as channel_inputs
         """
-        results = []
-        
-        logger.info(f"Starting collection for {len(channel_inputs)} channels")
-        
-        for i, channel_input in enumerate(channel_inputs, 1):
-            logger.info(f"Processing channel {i}/{len(channel_inputs)}: {channel_input}")
+        results = [None] * len(channel_inputs)
+        
+        logger.info(f"Starting collection for {len(channel_inputs)} channels ({max_workers} workers)")
+        
+        # Repeated inputs are collected once and share the same result
+        positions = {}
+        for i, channel_input in enumerate(channel_inputs):
+            positions.setdefault(channel_input.strip(), []).append(i)
+        
+        # Inputs that already are channel IDs (e.g. "Atualizar Canais") get their metadata
+        # from one channels.list call per 50 channels instead of one call each
+        known_ids = [channel_input for channel_input in positions if self.youtube.is_channel_id(channel_input)]
+        prefetched = self.youtube.get_channels_metadata(known_ids) if known_ids else {}
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    self.collect_channel, channel_input, mode=mode,
+                    metadata=prefetched.get(channel_input)
+                ): channel_input
+                for channel_input in positions
+            }
             
-            try:
-                result = self.collect_channel(channel_input, mode=mode)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Error collecting channel {channel_input}: {e}")
-                results.append({
-                    'status': 'error',
-                    'channel_input': channel_input,
-                    'message': str(e)
-                })
+            for done, future in enumerate(as_completed(futures), 1):
+                channel_input = futures[future]
+                logger.info(f"Finished channel {done}/{len(futures)}: {channel_input}")
+                
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error collecting channel {channel_input}: {e}")
+                    result = {
+                        'status': 'error',
+                        'channel_input': channel_input,
+                        'message': str(e)
+                    }
+                for i in positions[channel_input]:
+                    results[i] = result
+                
+                if progress_callback:
+                    progress_callback(done, len(futures))
         
         success_count = len([r for r in results if r['status'] == 'success'])
         logger.info(f"Collection complete: {success_count}/{len(channel_inputs)} channels successful")
         
         return results
     
-    def collect_snapshots_for_all_channels(self, snapshot_date: str = None) -> Dict:
+    def collect_snapshots_for_all_channels(self, snapshot_date: str = None,
+                                           max_workers: int = 8,
+                                           progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
         """
         Collect current view counts for all videos AND channel statistics, saving as snapshots.
         This should be run daily (manually or via scheduler) to enable delta-based rankings.
@@ -203,8 +239,14 @@ class Collector:
         - Video snapshots (for Delta per Video - Modo Gorgonoid Conteúdo)
         - Channel snapshots (for Delta Canal - Métrica Gorgonoid Planilha)
         
+        API calls for different channels run concurrently; each channel's snapshots
+        are then written in one transaction.
+        
         Args:
             snapshot_date: Date for snapshot (default: today, YYYY-MM-DD format)
+            max_workers: Number of channels fetched in parallel
+            progress_callback: Optional callable(done, total), called from the calling
+                               thread as each channel's snapshots are saved
         
         Returns:
             Dict with collection statistics
@@ -224,60 +266,69 @@ class Collector:
         skipped_channels = 0
         channels_with_stats = 0
         
-        for i, row in enumerate(channels, 1):
-            channel_id = row['channel_id']
-            channel_title = row['title']
-            logger.info(f"📹 Processing channel {i}/{total_channels}: {channel_title}")
-            
-            try:
-                # Get all video IDs for this channel
-                cursor.execute("SELECT video_id FROM videos WHERE channel_id = ?", (channel_id,))
-                video_ids = [r['video_id'] for r in cursor.fetchall()]
-                
+        # Get all video IDs per channel up front so worker threads never touch the DB
+        # (one streamed pass over tuple rows instead of a fetchall per channel)
+        channel_video_ids = {row['channel_id']: [] for row in channels}
+        id_cursor = self.db.conn.cursor()
+        id_cursor.row_factory = None
+        for channel_id, video_id in id_cursor.execute("SELECT channel_id, video_id FROM videos"):
+            if channel_id in channel_video_ids:
+                channel_video_ids[channel_id].append(video_id)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for row in channels:
+                video_ids = channel_video_ids[row['channel_id']]
                 if not video_ids:
-                    logger.warning(f"No videos found for channel {channel_title}, skipping")
+                    logger.warning(f"No videos found for channel {row['title']}, skipping")
                     skipped_channels += 1
                     continue
+                future = executor.submit(self._fetch_channel_snapshot, row['channel_id'], video_ids)
+                futures[future] = row
+            
+            for i, future in enumerate(as_completed(futures), 1):
+                channel_id = futures[future]['channel_id']
+                channel_title = futures[future]['title']
+                video_ids = channel_video_ids[channel_id]
+                logger.info(f"📹 Processing channel {i}/{len(futures)}: {channel_title}")
                 
-                # Fetch current stats from YouTube API (in batches of 50)
-                video_details = self.youtube.get_videos_details(video_ids)
-                
-                # Save video snapshots
-                saved_count = 0
-                for video in video_details:
-                    self.db.save_video_snapshot(
-                        video_id=video['video_id'],
-                        view_count=video['last_view_count'],
-                        snapshot_date=snapshot_date
-                    )
-                    saved_count += 1
-                    total_videos += 1
-                
-                logger.info(f"✅ Saved {saved_count}/{len(video_ids)} video snapshots for {channel_title}")
-                
-                # PARTE 1: Fetch and save channel statistics (synchronized with video snapshots)
                 try:
-                    channel_stats = self.youtube.get_channel_statistics(channel_id)
-                    if channel_stats:
-                        self.db.save_channel_snapshot(
-                            channel_id=channel_id,
-                            snapshot_date=snapshot_date,
-                            view_count=channel_stats['view_count'],
-                            subscriber_count=channel_stats.get('subscriber_count'),
-                            video_count=channel_stats.get('video_count')
-                        )
-                        channels_with_stats += 1
-                        logger.info(f"📊 Saved channel stats for {channel_title}: {channel_stats['view_count']:,} views")
-                    else:
-                        logger.warning(f"No channel statistics returned for {channel_title}")
-                except Exception as e_stats:
-                    logger.error(f"Failed to save channel stats for {channel_title}: {e_stats}")
-                    # Continue with other channels even if channel stats fail
+                    video_details, channel_stats = future.result()
+                    
+                    # Save video snapshots (single executemany per channel)
+                    self.db.bulk_save_video_snapshots([
+                        (video['video_id'], snapshot_date, video['last_view_count'], None, None)
+                        for video in video_details
+                    ])
+                    saved_count = len(video_details)
+                    total_videos += saved_count
+                    
+                    logger.info(f"✅ Saved {saved_count}/{len(video_ids)} video snapshots for {channel_title}")
+                    
+                    # PARTE 1: Save channel statistics (synchronized with video snapshots)
+                    try:
+                        if channel_stats:
+                            self.db.save_channel_snapshot(
+                                channel_id=channel_id,
+                                snapshot_date=snapshot_date,
+                                view_count=channel_stats['view_count'],
+                                subscriber_count=channel_stats.get('subscriber_count'),
+                                video_count=channel_stats.get('video_count')
+                            )
+                            channels_with_stats += 1
+                            logger.info(f"📊 Saved channel stats for {channel_title}: {channel_stats['view_count']:,} views")
+                        else:
+                            logger.warning(f"No channel statistics returned for {channel_title}")
+                    except Exception as e_stats:
+                        logger.error(f"Failed to save channel stats for {channel_title}: {e_stats}")
+                        # Continue with other channels even if channel stats fail
+                    
+                except Exception as e:
+                    logger.error(f"❌ Error collecting snapshots for {channel_title}: {e}")
+                    errors += 1
                 
-            except Exception as e:
-                logger.error(f"❌ Error collecting snapshots for {channel_title}: {e}")
-                errors += 1
-                continue
+                if progress_callback:
+                    progress_callback(i, len(futures))
         
         logger.info(f"🎯 Snapshot collection complete:")
         logger.info(f"   Videos: {total_videos} snapshots")
@@ -293,4 +344,23 @@ class Collector:
             'channels_skipped': skipped_channels,
             'errors': errors
         }
-
+    
+    def _fetch_channel_snapshot(self, channel_id: str, video_ids: List[str]) -> tuple:
+        """
+        Fetch current video and channel statistics for one channel (API only, no DB access).
+        
+        Returns:
+            (video_details, channel_stats) - channel_stats is None if unavailable
+        """
+        # Fetch current stats from YouTube API (in batches of 50); snapshots only need view counts
+        video_details = self.youtube.get_videos_details(
+            video_ids, fields='items(id,statistics/viewCount)'
+        )
+        
+        try:
+            channel_stats = self.youtube.get_channel_statistics(channel_id)
+        except Exception as e_stats:
+            logger.error(f"Failed to fetch channel stats for {channel_id}: {e_stats}")
+            channel_stats = None
+        
+        return video_details, channel_stats
@@ -19,6 +19,9 @@ class Config:
     # Update settings
     UPDATE_INTERVAL_HOURS = 24
     
+    # Days a cached YouTube API response may be revalidated via ETag before refetching
+    CACHE_TTL_DAYS = int(os.getenv('CACHE_TTL_DAYS', 7))
+    
     @classmethod
     def validate(cls):
         """Validate critical configuration."""
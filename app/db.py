@@ -3,12 +3,23 @@ Database operations for YouTube ranking system.
 """
 import sqlite3
 import logging
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Bump when init_db gains new tables/indexes/migrations (stored in PRAGMA user_version)
+SCHEMA_VERSION = 9
+
+
+def _sql_now() -> str:
+    """Current UTC time in SQLite datetime('now') format, bound once per write."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
 
 class Database:
     def __init__(self, db_path: str = "data/rankings.db"):
@@ -16,18 +27,53 @@ class Database:
         self.db_path = db_path
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
         self.conn = None
+        # Serializes use of the shared connection across collector threads. Database
+        # methods (reads and writes) take it themselves; only code that uses self.conn
+        # directly has to hold it
+        self.lock = threading.RLock()
         self._connect()
-        self.init_db()
+        # Schema DDL only runs when the file is older than this code (one integer read otherwise)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.init_db()
     
     def _connect(self):
         """Create database connection."""
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # Larger prepared-statement cache: hot SQL strings are parsed once and reused
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
         # Enable foreign keys for CASCADE operations
         self.conn.execute("PRAGMA foreign_keys = ON")
-        self.conn.execute("PRAGMA foreign_keys = ON")
+        # WAL lets the dashboard read while collectors write; NORMAL sync is safe under WAL
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        # ~50 MB page cache keeps large aggregations from spilling to temp b-trees
+        self.conn.execute("PRAGMA cache_size = -50000")
+        self.conn.execute("PRAGMA temp_store = MEMORY")
+        self.conn.execute("PRAGMA mmap_size = 268435456")
+        self.conn.execute("PRAGMA busy_timeout = 5000")
         self.conn.row_factory = sqlite3.Row
         logger.info(f"Connected to database: {self.db_path}")
     
+    @contextmanager
+    def _write_transaction(self):
+        """
+        Run a block of writes inside a single BEGIN IMMEDIATE ... COMMIT.
+        
+        Yields a cursor; rolls back on error so a failed batch leaves no partial rows.
+        Holds self.lock so collector threads sharing the connection never interleave
+        statements inside another thread's transaction.
+        """
+        with self.lock:
+            if self.conn.in_transaction:
+                self.conn.commit()
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+    
     def init_db(self):
         """Create database schema."""
         cursor = self.conn.cursor()
@@ -48,15 +94,50 @@ class Database:
             )
         """)
 
-        # Migration: Add brand column if not exists (for existing dbs)
-        try:
-            cursor.execute("SELECT brand FROM channels LIMIT 1")
-        except:
+        # Migration: Add brand column if not exists (for dbs created before schema v2)
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(channels)")}
+        if 'brand' not in columns:
             logger.info("Migrating schema: Adding 'brand' column to channels table")
-            try:
-                cursor.execute("ALTER TABLE channels ADD COLUMN brand TEXT")
-            except Exception as e:
-                logger.error(f"Migration failed: {e}")
+            cursor.execute("ALTER TABLE channels ADD COLUMN brand TEXT")
+        
+        # Covering index for the title-ordered channel list (no sort, no table lookups)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_channels_title ON channels(title, channel_id)
+        """)
+        
+        # Trigram index over channel titles for substring search (external content, kept in
+        # sync by triggers). Schema v6-v8 used a word tokenizer, which only matched word
+        # prefixes ("beast" missed "MrBeast"), so that index is replaced
+        cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'channels_fts'")
+        fts_row = cursor.fetchone()
+        fts_missing = fts_row is None or 'trigram' not in fts_row[0]
+        if fts_row is not None and fts_missing:
+            cursor.execute("DROP TABLE channels_fts")
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS channels_fts USING fts5(
+                title, content='channels', content_rowid='rowid',
+                tokenize='trigram'
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS channels_fts_ai AFTER INSERT ON channels BEGIN
+                INSERT INTO channels_fts(rowid, title) VALUES (new.rowid, new.title);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS channels_fts_ad AFTER DELETE ON channels BEGIN
+                INSERT INTO channels_fts(channels_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS channels_fts_au AFTER UPDATE OF title ON channels BEGIN
+                INSERT INTO channels_fts(channels_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+                INSERT INTO channels_fts(rowid, title) VALUES (new.rowid, new.title);
+            END
+        """)
+        if fts_missing:
+            # Index channels stored before schema v9
+            cursor.execute("INSERT INTO channels_fts(channels_fts) VALUES ('rebuild')")
         
         # Tabela de vídeos
         cursor.execute("""
@@ -76,11 +157,48 @@ class Database:
         
         # Índices
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_videos_channel_id ON videos(channel_id)
+            CREATE INDEX IF NOT EXISTS idx_videos_is_short ON videos(is_short)
         """)
+        # Superseded by the covering indexes below (both lead with channel_id)
+        cursor.execute("DROP INDEX IF EXISTS idx_videos_channel_id")
+        cursor.execute("DROP INDEX IF EXISTS idx_videos_channel_pub")
+        # Covering index for the incremental window query and the published-content
+        # comparison (seek on channel + date range, no table lookups)
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_videos_is_short ON videos(is_short)
+            CREATE INDEX IF NOT EXISTS idx_videos_channel_pub_cover
+            ON videos(channel_id, published_at DESC, video_id, is_short, last_view_count)
+        """)
+        # Covering index for the global ranking aggregation and the delta comparison
+        # join; also serves the per-channel top-videos ORDER BY ... LIMIT
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_videos_channel_views
+            ON videos(channel_id, last_view_count DESC, is_short, last_fetched_at, video_id)
+        """)
+        
+        # Per-channel video aggregates for the ranking pages, refreshed on every
+        # video write so page loads don't re-aggregate the videos table
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'channel_agg'")
+        agg_missing = cursor.fetchone() is None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS channel_agg (
+                channel_id TEXT PRIMARY KEY,
+                total_views INTEGER NOT NULL,
+                shorts_views INTEGER NOT NULL,
+                long_views INTEGER NOT NULL,
+                total_videos INTEGER NOT NULL,
+                shorts_count INTEGER NOT NULL,
+                long_count INTEGER NOT NULL,
+                last_update TEXT,
+                FOREIGN KEY (channel_id) REFERENCES channels(channel_id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_channel_agg_total_views
+            ON channel_agg(total_views DESC, channel_id)
         """)
+        if agg_missing:
+            # Aggregate videos stored before schema v8
+            self._refresh_channel_agg(cursor)
         
         # Tabela de snapshots
         cursor.execute("""
@@ -106,6 +224,11 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_snapshots_channel_date 
             ON channel_snapshots(channel_id, snapshot_date)
         """)
+        # Covering index for the latest-snapshot audit lookup
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_snapshots_channel_latest
+            ON channel_snapshots(channel_id, snapshot_date DESC, diff_percent, reported_channel_views, total_views)
+        """)
         
         # Video snapshots table (for delta-based ranking)
         cursor.execute("""
@@ -129,26 +252,45 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_video_snapshots_video_date 
             ON video_snapshots(video_id, snapshot_date)
         """)
+        # Covering index for delta-ranking lookups by date
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_video_snapshots_date_vid
+            ON video_snapshots(snapshot_date, video_id, view_count)
+        """)
+        
+        # YouTube API response cache (ETag revalidation across runs)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS yt_api_cache (
+                key TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                response BLOB NOT NULL,
+                fetched_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+        """)
+        
+        # Refresh planner statistics so SQLite picks the composite indexes
+        # (results persist in sqlite_stat1; init_db only runs on schema upgrades)
+        cursor.execute("ANALYZE")
         
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         self.conn.commit()
-        logger.info("Database schema initialized")
+        logger.info(f"Database schema initialized (version {SCHEMA_VERSION})")
     
     def upsert_channel(self, channel_id: str, title: str, handle: str = None, 
                       custom_url: str = None, country: str = None, uploads_playlist_id: str = None):
         """Insert or update channel."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO channels (channel_id, title, handle, custom_url, country, uploads_playlist_id, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-            ON CONFLICT(channel_id) DO UPDATE SET
-                title = excluded.title,
-                handle = excluded.handle,
-                custom_url = excluded.custom_url,
-                country = excluded.country,
-                uploads_playlist_id = excluded.uploads_playlist_id,
-                updated_at = datetime('now')
-        """, (channel_id, title, handle, custom_url, country, uploads_playlist_id))
-        self.conn.commit()
+        with self._write_transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO channels (channel_id, title, handle, custom_url, country, uploads_playlist_id, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(channel_id) DO UPDATE SET
+                    title = excluded.title,
+                    handle = excluded.handle,
+                    custom_url = excluded.custom_url,
+                    country = excluded.country,
+                    uploads_playlist_id = excluded.uploads_playlist_id,
+                    updated_at = excluded.updated_at
+            """, (channel_id, title, handle, custom_url, country, uploads_playlist_id, _sql_now()))
 
     def update_channel_brand(self, channel_title: str, brand: str):
         """Update brand for a channel by title."""
@@ -166,15 +308,29 @@ class Database:
     
     def upsert_videos(self, videos: List[Dict]):
         """Batch insert or update videos."""
-        cursor = self.conn.cursor()
+        now = _sql_now()
+        rows = [
+            (
+                video['video_id'],
+                video['channel_id'],
+                video['title'],
+                video['published_at'],
+                video['duration_seconds'],
+                video['is_short'],
+                video['is_live'],
+                video['last_view_count'],
+                now
+            )
+            for video in videos
+        ]
         
-        for video in videos:
-            cursor.execute("""
+        with self._write_transaction() as cursor:
+            cursor.executemany("""
                 INSERT INTO videos (
                     video_id, channel_id, title, published_at, duration_seconds,
                     is_short, is_live, last_view_count, last_fetched_at
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(video_id) DO UPDATE SET
                     title = excluded.title,
                     duration_seconds = excluded.duration_seconds,
@@ -182,42 +338,165 @@ class Database:
                     is_live = excluded.is_live,
                     last_view_count = excluded.last_view_count,
                     last_fetched_at = excluded.last_fetched_at
-            """, (
-                video['video_id'],
-                video['channel_id'],
-                video['title'],
-                video['published_at'],
-                video['duration_seconds'],
-                video['is_short'],
-                video['is_live'],
-                video['last_view_count']
-            ))
+            """, rows)
+            self._refresh_channel_agg(cursor, {video['channel_id'] for video in videos})
         
-        self.conn.commit()
         logger.info(f"Upserted {len(videos)} videos")
     
+    def update_video_classification(self, videos: List[Dict]):
+        """
+        Update only duration and Short/Long classification of stored videos.
+        
+        For re-classification from possibly cached API responses: view counts
+        and titles are left untouched so stale data never overwrites them.
+        """
+        if not videos:
+            return
+        
+        with self._write_transaction() as cursor:
+            cursor.executemany(
+                "UPDATE videos SET duration_seconds = ?, is_short = ? WHERE video_id = ?",
+                [(video['duration_seconds'], video['is_short'], video['video_id']) for video in videos]
+            )
+            self._refresh_channel_agg(cursor, {video['channel_id'] for video in videos})
+    
+    def _refresh_channel_agg(self, cursor, channel_ids=None):
+        """
+        Recompute channel_agg rows from videos inside the caller's transaction.
+        
+        Args:
+            cursor: Cursor of the open write transaction
+            channel_ids: Channels to refresh (None rebuilds the whole table)
+        """
+        where, params = "", []
+        if channel_ids is not None:
+            channel_ids = list(channel_ids)
+            where = f" WHERE channel_id IN ({','.join('?' * len(channel_ids))})"
+            params = channel_ids
+        
+        # Delete first so channels left without videos drop out of the ranking
+        cursor.execute("DELETE FROM channel_agg" + where, params)
+        cursor.execute(f"""
+            INSERT INTO channel_agg (
+                channel_id, total_views, shorts_views, long_views,
+                total_videos, shorts_count, long_count, last_update
+            )
+            SELECT 
+                channel_id,
+                SUM(last_view_count),
+                SUM(CASE WHEN is_short = 1 THEN last_view_count ELSE 0 END),
+                SUM(CASE WHEN is_short = 0 THEN last_view_count ELSE 0 END),
+                COUNT(*),
+                SUM(is_short),
+                SUM(CASE WHEN is_short = 0 THEN 1 ELSE 0 END),
+                MAX(last_fetched_at)
+            FROM videos{where}
+            GROUP BY channel_id
+        """, params)
+    
+    def refresh_channel_agg(self, channel_ids: List[str] = None):
+        """
+        Recompute the per-channel ranking aggregates.
+        
+        upsert_videos keeps them current; call this after writing to the
+        videos table directly (e.g. maintenance scripts).
+        
+        Args:
+            channel_ids: Channels to refresh (None rebuilds the whole table)
+        """
+        with self._write_transaction() as cursor:
+            self._refresh_channel_agg(cursor, channel_ids)
+    
+    def get_channel_ids(self) -> List[str]:
+        """Get all stored channel IDs."""
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.row_factory = None
+            cursor.execute("SELECT channel_id FROM channels")
+            return [row[0] for row in cursor]
+    
     def get_existing_video_ids(self, channel_id: str) -> set:
         """Get all video IDs for a channel."""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT video_id FROM videos WHERE channel_id = ?", (channel_id,))
-        return {row['video_id'] for row in cursor.fetchall()}
+        # Plain tuples, streamed straight into the set (no Row objects or intermediate list)
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.row_factory = None
+            cursor.execute("SELECT video_id FROM videos WHERE channel_id = ?", (channel_id,))
+            return {row[0] for row in cursor}
+    
+    def get_new_video_ids(self, channel_id: str, video_ids: List[str]) -> List[str]:
+        """
+        Return the candidate video IDs not yet stored for a channel.
+        
+        The set difference runs in SQL against the videos primary key, so the
+        channel's existing IDs never have to be loaded into Python.
+        
+        Args:
+            channel_id: Channel ID
+            video_ids: Candidate video IDs (e.g. from the uploads playlist)
+        
+        Returns:
+            New video IDs, in the same order as the input
+        """
+        # Candidates go in as one JSON parameter: no temp-table writes, so no
+        # implicit transaction is left open on the shared connection
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT value FROM json_each(?1)
+                WHERE value NOT IN (SELECT video_id FROM videos WHERE channel_id = ?2)
+                GROUP BY value
+                ORDER BY MIN(key)
+            """, (orjson.dumps(video_ids).decode(), channel_id))
+            return [row[0] for row in cursor.fetchall()]
+    
+    def get_incremental_video_ids(self, channel_id: str, new_video_ids: List[str]) -> List[str]:
+        """
+        Select every video to fetch in an incremental collection, in one query.
+        
+        Combines:
+        - New videos (as returned by get_new_video_ids)
+        - Recent videos (published in last 90 days) - views still growing
+        - ~10% random rotation of older videos to keep ranking accurate
+          (Bernoulli sample via random(), so no sort of the older videos is needed)
+        
+        Args:
+            channel_id: Channel ID
+            new_video_ids: Video IDs not yet stored for the channel
+        
+        Returns:
+            Deduplicated list of video IDs
+        """
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT video_id FROM videos
+                WHERE channel_id = ?1
+                  AND published_at >= date('now', '-90 days')
+                UNION
+                SELECT video_id FROM videos
+                WHERE channel_id = ?1
+                  AND published_at < date('now', '-90 days')
+                  AND abs(random()) % 10 = 0
+                UNION
+                SELECT value FROM json_each(?2)
+            """, (channel_id, orjson.dumps(new_video_ids).decode()))
+            return [row[0] for row in cursor.fetchall()]
     
     def get_channel_stats(self, channel_id: str) -> Dict:
         """Get aggregated stats for a channel."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT 
-                SUM(last_view_count) as total_views,
-                SUM(CASE WHEN is_short = 1 THEN last_view_count ELSE 0 END) as shorts_views,
-                SUM(CASE WHEN is_short = 0 THEN last_view_count ELSE 0 END) as long_views,
-                COUNT(*) as total_videos,
-                SUM(is_short) as shorts_videos,
-                SUM(CASE WHEN is_short = 0 THEN 1 ELSE 0 END) as long_videos
-            FROM videos
-            WHERE channel_id = ?
-        """, (channel_id,))
-        
-        row = cursor.fetchone()
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT 
+                    SUM(last_view_count) as total_views,
+                    SUM(CASE WHEN is_short = 1 THEN last_view_count ELSE 0 END) as shorts_views,
+                    SUM(CASE WHEN is_short = 0 THEN last_view_count ELSE 0 END) as long_views,
+                    COUNT(*) as total_videos,
+                    SUM(is_short) as shorts_videos,
+                    SUM(CASE WHEN is_short = 0 THEN 1 ELSE 0 END) as long_videos
+                FROM videos
+                WHERE channel_id = ?
+            """, (channel_id,)).fetchone()
         return {
             'total_views': row['total_views'] or 0,
             'shorts_views': row['shorts_views'] or 0,
@@ -228,45 +507,72 @@ class Database:
         }
     
     def create_snapshot(self, channel_id: str, snapshot_date: str = None, 
-                       reported_channel_views: int = None):
-        """Create daily snapshot for a channel."""
+                       reported_channel_views: int = None) -> Dict:
+        """
+        Create daily snapshot for a channel.
+        
+        Returns:
+            Aggregated stats stored in the snapshot (same keys as get_channel_stats)
+        """
         if snapshot_date is None:
             snapshot_date = datetime.now().strftime('%Y-%m-%d')
         
-        stats = self.get_channel_stats(channel_id)
-        
-        # Calculate divergence if reported views available
-        diff_percent = None
-        if reported_channel_views is not None and reported_channel_views > 0:
-            calculated = stats['total_views']
-            diff_percent = abs(calculated - reported_channel_views) / reported_channel_views * 100
-        
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT INTO channel_snapshots (
-                channel_id, snapshot_date, total_views, shorts_views, long_views,
-                total_videos, shorts_videos, long_videos, reported_channel_views, diff_percent
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(channel_id, snapshot_date) DO UPDATE SET
-                total_views = excluded.total_views,
-                shorts_views = excluded.shorts_views,
-                long_views = excluded.long_views,
-                total_videos = excluded.total_videos,
-                shorts_videos = excluded.shorts_videos,
-                long_videos = excluded.long_videos,
-                reported_channel_views = excluded.reported_channel_views,
-                diff_percent = excluded.diff_percent,
-                created_at = datetime('now')
-        """, (
-            channel_id, snapshot_date,
-            stats['total_views'], stats['shorts_views'], stats['long_views'],
-            stats['total_videos'], stats['shorts_videos'], stats['long_videos'],
-            reported_channel_views, diff_percent
-        ))
+        # Aggregate and insert in one statement. diff_percent (divergence vs. reported views)
+        # is computed in SQL too, so there is no read-modify-write between concurrent collectors.
+        with self._write_transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO channel_snapshots (
+                    channel_id, snapshot_date, total_views, shorts_views, long_views,
+                    total_videos, shorts_videos, long_videos, reported_channel_views, diff_percent
+                )
+                SELECT
+                    :channel_id, :snapshot_date,
+                    COALESCE(SUM(last_view_count), 0),
+                    COALESCE(SUM(CASE WHEN is_short = 1 THEN last_view_count ELSE 0 END), 0),
+                    COALESCE(SUM(CASE WHEN is_short = 0 THEN last_view_count ELSE 0 END), 0),
+                    COUNT(*),
+                    COALESCE(SUM(is_short), 0),
+                    COALESCE(SUM(CASE WHEN is_short = 0 THEN 1 ELSE 0 END), 0),
+                    :reported,
+                    CASE WHEN :reported > 0
+                        THEN ABS(COALESCE(SUM(last_view_count), 0) - :reported) * 100.0 / :reported
+                        ELSE NULL
+                    END
+                FROM videos
+                WHERE channel_id = :channel_id
+                ON CONFLICT(channel_id, snapshot_date) DO UPDATE SET
+                    total_views = excluded.total_views,
+                    shorts_views = excluded.shorts_views,
+                    long_views = excluded.long_views,
+                    total_videos = excluded.total_videos,
+                    shorts_videos = excluded.shorts_videos,
+                    long_videos = excluded.long_videos,
+                    reported_channel_views = excluded.reported_channel_views,
+                    diff_percent = excluded.diff_percent,
+                    created_at = :now
+                RETURNING total_views, shorts_views, long_views,
+                          total_videos, shorts_videos, long_videos
+            """, {
+                'channel_id': channel_id,
+                'snapshot_date': snapshot_date,
+                'reported': reported_channel_views,
+                'now': _sql_now()
+            })
+            stats = dict(cursor.fetchone())
         
-        self.conn.commit()
         logger.info(f"Created snapshot for channel {channel_id} on {snapshot_date}")
+        return stats
+    
+    # Re-running a snapshot on the same date refreshes the counts (idempotent)
+    _VIDEO_SNAPSHOT_UPSERT = """
+        INSERT INTO video_snapshots 
+        (video_id, snapshot_date, view_count, like_count, comment_count)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(video_id, snapshot_date) DO UPDATE SET
+            view_count = excluded.view_count,
+            like_count = COALESCE(excluded.like_count, like_count),
+            comment_count = COALESCE(excluded.comment_count, comment_count)
+    """
     
     def save_video_snapshot(self, video_id: str, view_count: int, 
                            snapshot_date: str = None, like_count: int = None, 
@@ -284,15 +590,39 @@ class Database:
         if snapshot_date is None:
             snapshot_date = datetime.now().strftime('%Y-%m-%d')
         
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            INSERT OR IGNORE INTO video_snapshots 
-            (video_id, snapshot_date, view_count, like_count, comment_count)
-            VALUES (?, ?, ?, ?, ?)
-        """, (video_id, snapshot_date, view_count, like_count, comment_count))
-        self.conn.commit()
+        with self._write_transaction() as cursor:
+            cursor.execute(
+                self._VIDEO_SNAPSHOT_UPSERT,
+                (video_id, snapshot_date, view_count, like_count, comment_count)
+            )
         logger.debug(f"Saved snapshot for video {video_id} on {snapshot_date}: {view_count:,} views")
     
+    def bulk_save_video_snapshots(self, rows: List[Tuple]):
+        """
+        Save many video snapshots in one transaction.
+        
+        Args:
+            rows: Tuples of (video_id, snapshot_date, view_count, like_count, comment_count)
+        """
+        with self._write_transaction() as cursor:
+            cursor.executemany(self._VIDEO_SNAPSHOT_UPSERT, rows)
+        logger.debug(f"Saved {len(rows)} video snapshots")
+    
+    def bulk_update_reported_views(self, rows: List[Tuple]):
+        """
+        Overwrite reported_channel_views of many channel snapshots in one transaction.
+        
+        Args:
+            rows: Tuples of (reported_channel_views, channel_id, snapshot_date)
+        """
+        with self._write_transaction() as cursor:
+            cursor.executemany("""
+                UPDATE channel_snapshots 
+                SET reported_channel_views = ? 
+                WHERE channel_id = ? AND snapshot_date = ?
+            """, rows)
+        logger.debug(f"Updated reported views of {len(rows)} channel snapshots")
+    
     def get_video_snapshot(self, video_id: str, snapshot_date: str) -> Optional[int]:
         """
         Get view count for a video on a specific date.
@@ -304,12 +634,11 @@ class Database:
         Returns:
             View count or None if no snapshot exists
         """
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT view_count FROM video_snapshots
-            WHERE video_id = ? AND snapshot_date = ?
-        """, (video_id, snapshot_date))
-        row = cursor.fetchone()
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT view_count FROM video_snapshots
+                WHERE video_id = ? AND snapshot_date = ?
+            """, (video_id, snapshot_date)).fetchone()
         return row['view_count'] if row else None
     
     def get_latest_snapshot_date(self) -> Optional[str]:
@@ -319,29 +648,27 @@ class Database:
         Returns:
             Latest snapshot date (YYYY-MM-DD) or None
         """
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT MAX(snapshot_date) as latest FROM video_snapshots")
-        row = cursor.fetchone()
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(snapshot_date) as latest FROM video_snapshots").fetchone()
         return row['latest'] if row and row['latest'] else None
     
     def get_snapshot_stats(self) -> Dict:
         """Get statistics about snapshot coverage."""
-        cursor = self.conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM video_snapshots")
-        total_snapshots = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT video_id) FROM video_snapshots")
-        videos_with_snapshots = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(DISTINCT snapshot_date) FROM video_snapshots")
-        unique_dates = cursor.fetchone()[0]
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT
+                    COUNT(*) as total_snapshots,
+                    COUNT(DISTINCT video_id) as videos_tracked,
+                    COUNT(DISTINCT snapshot_date) as unique_dates,
+                    MAX(snapshot_date) as latest_date
+                FROM video_snapshots
+            """).fetchone()
         
         return {
-            'total_snapshots': total_snapshots,
-            'videos_tracked': videos_with_snapshots,
-            'unique_dates': unique_dates,
-            'latest_date': self.get_latest_snapshot_date()
+            'total_snapshots': row['total_snapshots'],
+            'videos_tracked': row['videos_tracked'],
+            'unique_dates': row['unique_dates'],
+            'latest_date': row['latest_date']
         }
     
     def save_channel_snapshot(self, channel_id: str, snapshot_date: str, 
@@ -350,22 +677,21 @@ class Database:
         Save channel statistics snapshot (for Delta Canal - Gorgonoid Planilha).
         Uses reported_channel_views field to store official YouTube channel viewCount.
         """
-        cursor = self.conn.cursor()
         try:
             # For now, store in reported_channel_views field
             # In future migrations, consider adding dedicated columns
-            cursor.execute("""
-                INSERT INTO channel_snapshots (
-                    channel_id, snapshot_date, 
-                    reported_channel_views,
-                    total_views, shorts_views, long_views,
-                    total_videos, shorts_videos, long_videos
-                )
-                VALUES (?, ?, ?, 0, 0, 0, 0, 0, 0)
-                ON CONFLICT(channel_id, snapshot_date) DO UPDATE SET
-                    reported_channel_views = excluded.reported_channel_views
-            """, (channel_id, snapshot_date, view_count))
-            self.conn.commit()
+            with self._write_transaction() as cursor:
+                cursor.execute("""
+                    INSERT INTO channel_snapshots (
+                        channel_id, snapshot_date, 
+                        reported_channel_views,
+                        total_views, shorts_views, long_views,
+                        total_videos, shorts_videos, long_videos
+                    )
+                    VALUES (?, ?, ?, 0, 0, 0, 0, 0, 0)
+                    ON CONFLICT(channel_id, snapshot_date) DO UPDATE SET
+                        reported_channel_views = excluded.reported_channel_views
+                """, (channel_id, snapshot_date, view_count))
             logger.debug(f"Saved channel snapshot for {channel_id} on {snapshot_date}: {view_count:,} views")
         except Exception as e:
             logger.error(f"Error saving channel snapshot for {channel_id}: {e}")
@@ -373,20 +699,66 @@ class Database:
     
     def get_channel_snapshot(self, channel_id: str, snapshot_date: str) -> Optional[int]:
         """Get channel viewCount for a specific date."""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT reported_channel_views FROM channel_snapshots
-            WHERE channel_id = ? AND snapshot_date = ?
-        """, (channel_id, snapshot_date))
-        row = cursor.fetchone()
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT reported_channel_views FROM channel_snapshots
+                WHERE channel_id = ? AND snapshot_date = ?
+            """, (channel_id, snapshot_date)).fetchone()
         return row['reported_channel_views'] if row else None
     
+    def get_api_cache(self, key: str, max_age_days: int = 7) -> Optional[Tuple[str, Dict]]:
+        """
+        Get a cached YouTube API response.
+        
+        Args:
+            key: Cache key (e.g. 'playlistItems:<playlist_id>:<page_token>')
+            max_age_days: Entries fetched longer ago than this are treated as missing
+        
+        Returns:
+            (etag, response) or None
+        """
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT etag, response FROM yt_api_cache
+                WHERE key = ? AND fetched_at >= datetime('now', ?)
+            """, (key, f'-{max_age_days} days'))
+            row = cursor.fetchone()
+        return (row['etag'], orjson.loads(row['response'])) if row else None
+    
+    def put_api_cache(self, key: str, etag: str, response: Dict):
+        """Store (or refresh) a YouTube API response with its ETag."""
+        with self._write_transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO yt_api_cache (key, etag, response, fetched_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    etag = excluded.etag,
+                    response = excluded.response,
+                    fetched_at = excluded.fetched_at
+            """, (key, etag, orjson.dumps(response).decode(), _sql_now()))
+    
+    def prune_api_cache(self, max_age_days: int = 7) -> int:
+        """
+        Delete cached API responses older than max_age_days.
+        
+        get_api_cache already treats them as missing, so this only reclaims space.
+        
+        Returns:
+            Number of entries deleted
+        """
+        with self._write_transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM yt_api_cache WHERE fetched_at < datetime('now', ?)",
+                (f'-{max_age_days} days',)
+            )
+            return cursor.rowcount
+    
     def delete_channel(self, channel_id: str):
         """Delete channel and all associated data."""
-        cursor = self.conn.cursor()
         # Due to ON DELETE CASCADE, videos and snapshots will be deleted automatically
-        cursor.execute("DELETE FROM channels WHERE channel_id = ?", (channel_id,))
-        self.conn.commit()
+        with self._write_transaction() as cursor:
+            cursor.execute("DELETE FROM channels WHERE channel_id = ?", (channel_id,))
         logger.info(f"Deleted channel {channel_id}")
 
     def close(self):
@@ -4,28 +4,26 @@ Streamlit Dashboard for YouTube Channel Ranking System
 import os
 import sys
 import logging
+import math
+import functools
+import calendar
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 from dotenv import load_dotenv
 import streamlit as st
 import pandas as pd
+import numpy as np
 
 # Add app directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from config import Config
 from db import Database
 from youtube_client import YouTubeClient
 from collector import Collector
 from ranking import RankingEngine
 
-# Load environment variables
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # Page configuration
@@ -36,6 +34,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# st.fragment (experimental_fragment before 1.37) scopes widget reruns to the decorated
+# function; on older Streamlit versions it falls back to a plain call
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -57,6 +59,19 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+@st.cache_resource(show_spinner=False)
+def init_environment():
+    """Load .env and configure logging once per process (not on every rerun)."""
+    # Load environment variables
+    load_dotenv()
+    
+    # Configure logging
+    logging.basicConfig(
+        level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
 @st.cache_resource
 def init_components():
     """Initialize database and API clients."""
@@ -68,15 +83,70 @@ def init_components():
         st.stop()
     
     db = Database(db_path)
-    youtube = YouTubeClient(api_key)
+    youtube = YouTubeClient(api_key, cache=db, cache_ttl_days=Config.CACHE_TTL_DAYS)
     collector = Collector(youtube, db)
     ranking = RankingEngine(db)
     
     return db, youtube, collector, ranking
 
 
+def format_series(values: pd.Series) -> pd.Series:
+    """Vectorized format_number for a whole column (same output, no per-cell Python call)."""
+    arr = values.fillna(0).to_numpy(dtype=np.float64)
+    conditions = [arr >= 1_000_000_000, arr >= 1_000_000, arr >= 1_000]
+    scale = np.select(conditions, [1_000_000_000, 1_000_000, 1_000], default=1)
+    suffix = np.select(conditions, ['B', 'M', 'K'], default='')
+    scaled = np.char.add(np.char.mod('%.2f', arr / scale), suffix)
+    plain = np.char.mod('%d', arr.astype(np.int64))
+    return pd.Series(np.where(suffix == '', plain, scaled), index=values.index)
+
+
+@functools.lru_cache(maxsize=1)
+def _logo_files() -> frozenset:
+    """Logo file names under assets/logos, listed once per process."""
+    logo_dir = 'assets/logos'
+    return frozenset(os.listdir(logo_dir)) if os.path.isdir(logo_dir) else frozenset()
+
+
+def get_brand_logo(brand_name):
+    """Path of a brand's logo ("" for no brand, None if no logo file exists)."""
+    if not brand_name or brand_name in ['?', 'Sem Patrocínio']:
+        return ""
+        
+    safe_name = brand_name.lower().replace(" ", "_").replace(".", "")
+    if f"{safe_name}.png" in _logo_files():
+        return f"assets/logos/{safe_name}.png"
+    return None
+
+
+_THOUSANDS_TO_BR = str.maketrans({',': '.'})
+
+
+def format_thousands(values: pd.Series) -> pd.Series:
+    """Format a column as integers with '.' thousand separators (e.g. 1.234.567)."""
+    as_int = values.fillna(0).astype(np.float64).round().astype(np.int64)
+    return as_int.map('{:,}'.format).str.translate(_THOUSANDS_TO_BR)
+
+
+def coalesce_columns(df: pd.DataFrame, *columns: str, default=0) -> pd.Series:
+    """First non-null value among `columns` per row, like chained dict.get() fallbacks."""
+    # All-NA columns contribute nothing, and combine_first/fillna warn on them (and on
+    # object columns that would be downcast), so skip them and infer dtypes up front
+    present = [
+        df[column].infer_objects() for column in columns
+        if column in df.columns and df[column].notna().any()
+    ]
+    if not present:
+        return pd.Series(default, index=df.index)
+    result = present[0]
+    for fallback in present[1:]:
+        result = result.combine_first(fallback)
+    return result.infer_objects().fillna(default)
+
+
+@functools.lru_cache(maxsize=4096)
 def format_number(num):
-    """Format large numbers with thousand separators."""
+    """Format large numbers with thousand separators (pure, so memoized across reruns)."""
     if num is None:
         return "0"
     if num >= 1_000_000_000:
@@ -88,6 +158,110 @@ def format_number(num):
     return str(num)
 
 
+# Ranking page "Exibir" options served from the cached top slice; "Todos" is paginated
+TOP_N_OPTIONS = {
+    "Top 10": 10,
+    "Top 50": 50,
+    "Top 100": 100,
+    "Top 500": 500
+}
+RANKING_PAGE_SIZE = 100
+
+# NumberColumn gained the client-side 'compact' (1.2M) format preset in Streamlit 1.42.
+# Older versions (the pinned 1.29) have no printf format that reads as well, so they
+# keep the preformatted format_number strings
+VIEWS_COMPACT_FORMAT = tuple(int(p) for p in st.__version__.split('.')[:2]) >= (1, 42)
+
+
+def views_column(views: pd.Series) -> pd.Series:
+    """View counts for the ranking table: raw numbers when the client can format them."""
+    return views if VIEWS_COMPACT_FORMAT else format_series(views)
+
+
+def views_column_config(**kwargs):
+    """Column config matching views_column (compact NumberColumn, or TextColumn)."""
+    if VIEWS_COMPACT_FORMAT:
+        return st.column_config.NumberColumn(format='compact', **kwargs)
+    return st.column_config.TextColumn(**kwargs)
+
+
+def invalidate_caches(*loaders):
+    """Clear only the given cached loaders, keeping unrelated cache entries warm."""
+    for loader in loaders:
+        loader.clear()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_global_ranking(_ranking, search: str = None):
+    """
+    Top ranking rows (up to the largest Top-N option) and total channel count
+    for a search filter (cached across reruns).
+    
+    Keyed only on the search term: changing the Top-N selector slices this
+    result instead of issuing a new query.
+    """
+    ranking_data = _ranking.get_global_ranking(limit=max(TOP_N_OPTIONS.values()), offset=0, search_query=search)
+    total_channels = ranking_data[0]['total_count'] if ranking_data else 0
+    return ranking_data, total_channels
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_ranking_page(_ranking, page: int, search: str = None):
+    """One RANKING_PAGE_SIZE page of the full ranking, fetched with LIMIT/OFFSET (cached across reruns)."""
+    return _ranking.get_global_ranking(
+        limit=RANKING_PAGE_SIZE, offset=(page - 1) * RANKING_PAGE_SIZE, search_query=search
+    )
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_global_totals(_ranking, top_n: int, search: str = None):
+    """Header totals over the top `top_n` channels (-1 for all), aggregated in SQLite (cached across reruns)."""
+    return _ranking.get_global_totals(limit=top_n, search_query=search)
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_month_options(anchor_month: str):
+    """Period selector options: 'Personalizado' plus the 6 months up to `anchor_month` (YYYY-MM)."""
+    anchor = pd.Timestamp(anchor_month)
+    month_options = ["Personalizado"]
+    for i in range(6):
+        date = anchor - pd.DateOffset(months=i)
+        month_options.append(f"{calendar.month_name[date.month]} {date.year}")
+    return month_options
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_channel_details(_ranking, channel_id: str):
+    """Channel details with top videos (cached across reruns)."""
+    return _ranking.get_channel_details(channel_id)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_channel_history(_ranking, channel_id: str, days: int = 30):
+    """Channel snapshot history DataFrame for the chart (cached across reruns)."""
+    return _ranking.get_channel_history(channel_id, days=days)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_snapshot_stats(_db):
+    """Snapshot coverage stats for the sidebar (cached across reruns)."""
+    return _db.get_snapshot_stats()
+
+
+@st.cache_data(ttl=120, show_spinner=False)
+def load_channel_options(_db):
+    """Map of channel_id -> title, ordered by title (cached across reruns)."""
+    with _db.lock:
+        channels = pd.read_sql("SELECT channel_id, title FROM channels ORDER BY title", _db.conn)
+    return channels.set_index('channel_id')['title'].to_dict()
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_comparison(_ranking, method_name: str, channel_ids: tuple, start_date: str, end_date: str):
+    """Result of a RankingEngine comparison method, keyed on method, channels and period."""
+    return getattr(_ranking, method_name)(list(channel_ids), start_date, end_date)
+
+
 def page_ranking():
     """Main ranking page."""
     st.title("📊 YouTube Channel Ranking")
@@ -98,19 +272,16 @@ def page_ranking():
     # Filters in sidebar
     st.sidebar.header("Filtros")
     
-    # Top N filter
-    top_n_options = {
-        "Top 10": 10,
-        "Top 50": 50,
-        "Top 100": 100,
-        "Top 500": 500,
-        "Todos": 999999
-    }
-    top_n_label = st.sidebar.selectbox("Exibir", list(top_n_options.keys()), index=2)
-    top_n = top_n_options[top_n_label]
-    
-    # Search filter
-    search_query = st.sidebar.text_input("🔍 Buscar canal", "")
+    # Filters are batched in a form: edits apply together on "Aplicar" (one rerun)
+    with st.sidebar.form("ranking_filters"):
+        # Top N filter ("Todos" is paginated)
+        top_n_label = st.selectbox("Exibir", [*TOP_N_OPTIONS, "Todos"], index=2)
+        
+        # Search filter
+        search_query = st.text_input("🔍 Buscar canal", "")
+        
+        st.form_submit_button("Aplicar")
+    top_n = TOP_N_OPTIONS.get(top_n_label)
     
     # Manual update button
     st.sidebar.markdown("---")
@@ -119,42 +290,51 @@ def page_ranking():
     if st.sidebar.button("🔄 Atualizar Canais", help="Atualizar dados de todos os canais"):
         with st.spinner("Coletando dados..."):
             # Get list of existing channels
-            cursor = db.conn.cursor()
-            cursor.execute("SELECT DISTINCT channel_id FROM channels")
-            channel_ids = [row[0] for row in cursor.fetchall()]
+            channel_ids = db.get_channel_ids()
             
             if channel_ids:
                 st.info(f"Atualizando {len(channel_ids)} canais...")
                 progress_bar = st.progress(0)
                 
-                for i, channel_id in enumerate(channel_ids):
-                    try:
-                        collector.collect_channel(channel_id, mode='incremental')
-                        progress_bar.progress((i + 1) / len(channel_ids))
-                    except Exception as e:
-                        st.warning(f"Erro ao atualizar {channel_id}: {e}")
+                # Channels are collected concurrently; the bar advances as each one finishes
+                results = collector.collect_channels(
+                    channel_ids,
+                    mode='incremental',
+                    progress_callback=lambda done, total: progress_bar.progress(done / total)
+                )
+                for channel_id, result in zip(channel_ids, results):
+                    if result['status'] != 'success':
+                        st.warning(f"Erro ao atualizar {channel_id}: {result.get('message', 'Desconhecido')}")
                 
                 st.success("✅ Atualização concluída!")
-                st.cache_data.clear()
+                invalidate_caches(
+                    load_global_ranking, load_ranking_page, load_global_totals, load_comparison,
+                    load_channel_options, load_channel_details, load_channel_history
+                )
             else:
                 st.warning("Nenhum canal para atualizar. Adicione canais primeiro.")
     
     # Add new channel section
     with st.sidebar.expander("➕ Adicionar Canal"):
-        channel_input = st.text_input(
-            "ID, @handle ou URL",
-            placeholder="@MrBeast ou UCX6OQ3DkcsbYNE6H8uQQuVA",
-            help="Aceita: channel ID, @handle, ou URL completa"
-        )
+        with st.form("add_channel", clear_on_submit=True):
+            channel_input = st.text_input(
+                "ID, @handle ou URL",
+                placeholder="@MrBeast ou UCX6OQ3DkcsbYNE6H8uQQuVA",
+                help="Aceita: channel ID, @handle, ou URL completa"
+            )
+            add_submitted = st.form_submit_button("Adicionar")
         
-        if st.button("Adicionar"):
+        if add_submitted:
             if channel_input:
                 with st.spinner(f"Coletando {channel_input}..."):
                     try:
                         result = collector.collect_channel(channel_input, mode='full')
                         if result['status'] == 'success':
                             st.success(f"✅ Canal adicionado: {result['title']}")
-                            st.cache_data.clear()
+                            invalidate_caches(
+                                load_global_ranking, load_ranking_page, load_global_totals,
+                                load_comparison, load_channel_options
+                            )
                         else:
                             st.error(f"❌ Erro: {result.get('message', 'Desconhecido')}")
                     except Exception as e:
@@ -164,29 +344,18 @@ def page_ranking():
     
     # Get ranking data
     search = search_query if search_query else None
-    ranking_data = ranking.get_global_ranking(limit=top_n, offset=0, search_query=search)
-    total_channels = ranking.get_total_channels_count(search_query=search)
+    top_ranking, total_channels = load_global_ranking(ranking, search)
+    if top_n is None:
+        # "Todos": only the visible page is queried, formatted and sent to the browser
+        page_count = max(1, math.ceil(total_channels / RANKING_PAGE_SIZE))
+        page = st.sidebar.number_input("Página", min_value=1, max_value=page_count, value=1)
+        ranking_data = load_ranking_page(ranking, int(page), search)
+    else:
+        ranking_data = top_ranking[:top_n]
+    df = pd.DataFrame(ranking_data)
     
     # Display statistics
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric("Total de Canais", total_channels)
-    
-    with col2:
-        if ranking_data:
-            total_views = sum(r['total_views'] for r in ranking_data)
-            st.metric("Total de Views", format_number(total_views))
-    
-    with col3:
-        if ranking_data:
-            total_videos = sum(r['total_videos'] for r in ranking_data)
-            st.metric("Total de Vídeos", format_number(total_videos))
-    
-    with col4:
-        if ranking_data:
-            total_shorts = sum(r['shorts_count'] for r in ranking_data)
-            st.metric("Total de Shorts", format_number(total_shorts))
+    metric_cards(ranking, total_channels, top_n or -1, search, show_totals=bool(ranking_data))
     
     st.markdown("---")
     
@@ -194,20 +363,19 @@ def page_ranking():
     if not ranking_data:
         st.info("Nenhum canal encontrado. Adicione canais usando o painel lateral.")
     else:
-        # Convert to DataFrame
-        df = pd.DataFrame(ranking_data)
-        
         # Format for display
         display_df = pd.DataFrame({
             'Rank': df['rank'],
             'Canal': df['title'],
             'Handle': df['handle'].fillna('-'),
-            'Total Views': df['total_views'].apply(format_number),
-            'Shorts Views': df['shorts_views'].apply(format_number),
-            'Long Views': df['long_views'].apply(format_number),
+            # Numeric views (Streamlit 1.42+): compact Arrow payload and numeric sorting
+            'Total Views': views_column(df['total_views']),
+            'Shorts Views': views_column(df['shorts_views']),
+            'Long Views': views_column(df['long_views']),
             'Vídeos': df['total_videos'],
             'Shorts': df['shorts_count'],
-            'Última Atualização': pd.to_datetime(df['last_update']).dt.strftime('%Y-%m-%d %H:%M')
+            # last_update is SQLite 'YYYY-MM-DD HH:MM:SS' text; trim the seconds instead of parsing
+            'Última Atualização': df['last_update'].astype('string').str.slice(0, 16).str.replace('T', ' ', regex=False)
         })
         
         # Display table with enhanced info
@@ -219,9 +387,9 @@ def page_ranking():
                 'Rank': st.column_config.NumberColumn(width='small'),
                 'Canal': st.column_config.TextColumn(width='large'),
                 'Handle': st.column_config.TextColumn(width='medium'),
-                'Total Views': st.column_config.TextColumn(width='medium', help='Soma de visualizações de todos os vídeos'),
-                'Shorts Views': st.column_config.TextColumn(width='medium'),
-                'Long Views': st.column_config.TextColumn(width='medium'),
+                'Total Views': views_column_config(width='medium', help='Soma de visualizações de todos os vídeos'),
+                'Shorts Views': views_column_config(width='medium'),
+                'Long Views': views_column_config(width='medium'),
                 'Vídeos': st.column_config.NumberColumn(width='small'),
                 'Shorts': st.column_config.NumberColumn(width='small'),
                 'Última Atualização': st.column_config.TextColumn(width='medium', help='Última vez que os dados deste canal foram atualizados')
@@ -232,20 +400,47 @@ def page_ranking():
         st.markdown("---")
         st.subheader("Detalhes do Canal")
         
-        selected_channel = st.selectbox(
-            "Selecione um canal para ver detalhes",
-            options=df['channel_id'].tolist(),
-            format_func=lambda x: df[df['channel_id'] == x]['title'].values[0]
-        )
-        
-        if selected_channel:
-            display_channel_details(selected_channel, ranking)
+        channel_details_panel(dict(zip(df['channel_id'], df['title'])), ranking, db)
 
 
-def display_channel_details(channel_id: str, ranking_engine):
-    """Display detailed information for a channel."""
-    details = ranking_engine.get_channel_details(channel_id)
+def metric_cards(ranking_engine, total_channels: int, top_n: int, search: str = None, show_totals: bool = True):
+    """Header metric cards; totals come from the cached SQL aggregate, not the ranking rows."""
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Total de Canais", total_channels)
     
+    if not show_totals:
+        return
+    
+    totals = load_global_totals(ranking_engine, top_n, search)
+    
+    with col2:
+        st.metric("Total de Views", format_number(totals['total_views']))
+    
+    with col3:
+        st.metric("Total de Vídeos", format_number(totals['total_videos']))
+    
+    with col4:
+        st.metric("Total de Shorts", format_number(totals['shorts_count']))
+
+
+@fragment
+def channel_details_panel(titles: dict, ranking_engine, db: Database):
+    """Channel selector + details; as a fragment, picking a channel reruns only this panel."""
+    selected_channel = st.selectbox(
+        "Selecione um canal para ver detalhes",
+        options=list(titles),
+        format_func=titles.get
+    )
+    
+    if selected_channel:
+        details = load_channel_details(ranking_engine, selected_channel)
+        display_channel_details(selected_channel, details, ranking_engine, db)
+
+
+def display_channel_details(channel_id: str, details: Optional[dict], ranking_engine, db: Database):
+    """Display detailed information for a channel (details as returned by get_channel_details)."""
     if not details:
         st.error("Canal não encontrado")
         return
@@ -268,11 +463,14 @@ def display_channel_details(channel_id: str, ranking_engine):
         col_conf_1, col_conf_2 = st.columns(2)
         with col_conf_1:
             if st.button("✅ Sim, excluir", key="confirm_delete"):
-                db, _, _, _ = init_components()
                 db.delete_channel(channel_id)
                 st.success("Canal excluído com sucesso!")
                 st.session_state.show_delete_confirm = False
-                st.cache_data.clear()
+                invalidate_caches(
+                    load_global_ranking, load_ranking_page, load_global_totals, load_comparison,
+                    load_channel_options, load_snapshot_stats, load_channel_details,
+                    load_channel_history
+                )
                 # Rerun to update list
                 st.rerun()
         with col_conf_2:
@@ -281,16 +479,7 @@ def display_channel_details(channel_id: str, ranking_engine):
                 st.rerun()
     
     # Show data quality indicator
-    db, _, _, ranking = init_components()
-    cursor = db.conn.cursor()
-    cursor.execute("""
-        SELECT diff_percent, reported_channel_views, total_views, snapshot_date
-        FROM channel_snapshots
-        WHERE channel_id = ?
-        ORDER BY snapshot_date DESC
-        LIMIT 1
-    """, (channel_id,))
-    snapshot = cursor.fetchone()
+    snapshot = details['snapshot']
     
     if snapshot and snapshot['diff_percent'] is not None:
         diff = snapshot['diff_percent']
@@ -349,16 +538,14 @@ def display_channel_details(channel_id: str, ranking_engine):
     st.markdown("### 📋 Top 10 Vídeos")
     
     if details['top_10_videos']:
-        top_10_df = pd.DataFrame([
-            {
-                'Título': v['title'],
-                'Views': format_number(v['last_view_count']),
-                'Tipo': 'Short' if v['is_short'] else 'Long',
-                'Publicado': v['published_at'][:10],
-                'Link': f"https://youtube.com/watch?v={v['video_id']}"
-            }
-            for v in details['top_10_videos']
-        ])
+        videos_df = pd.DataFrame.from_records(details['top_10_videos'])
+        top_10_df = pd.DataFrame({
+            'Título': videos_df['title'],
+            'Views': format_series(videos_df['last_view_count']),
+            'Tipo': np.where(videos_df['is_short'] == 1, 'Short', 'Long'),
+            'Publicado': videos_df['published_at'].str.slice(0, 10),
+            'Link': 'https://youtube.com/watch?v=' + videos_df['video_id']
+        })
         
         st.dataframe(
             top_10_df,
@@ -371,20 +558,54 @@ def display_channel_details(channel_id: str, ranking_engine):
     
     # Historical chart
     st.markdown("### 📈 Evolução Histórica (últimos 30 dias)")
-    history = ranking_engine.get_channel_history(channel_id, days=30)
+    history = load_channel_history(ranking_engine, channel_id, days=30)
     
-    if history:
-        history_df = pd.DataFrame(history)
-        history_df['snapshot_date'] = pd.to_datetime(history_df['snapshot_date'])
-        
+    if not history.empty:
         st.line_chart(
-            history_df.set_index('snapshot_date')[['total_views', 'shorts_views', 'long_views']],
+            history[['total_views', 'shorts_views', 'long_views']],
             use_container_width=True
         )
     else:
         st.info("Sem dados históricos disponíveis ainda")
 
 
+# Comparison methodology -> (RankingEngine method, title, explanation, delta-canal columns)
+COMPARISON_MODES = {
+    "📊 Gorgonoid Canal (Delta Canal)": (
+        'get_comparison_data_delta_channel',
+        "Gorgonoid Canal (Delta Canal)",
+        "ℹ️ **Metodologia Gorgonoid (Delta Canal - Planilha)**\n\n"
+        "Este ranking usa o **viewCount total do canal** (da API oficial do YouTube). "
+        "Métricas:\n"
+        "- **Ant:** Views totais do canal no início do período\n"
+        "- **Atual:** Views totais do canal no fim do período\n"
+        "- **Reais:** Crescimento absoluto (Atual - Ant)\n"
+        "- **%:** Percentual de crescimento\n\n"
+        "⚠️ Requer snapshots diários (coletar primeiro snapshot, aguardar 1+ dia).",
+        True
+    ),
+    "🎬 Gorgonoid Conteúdo (Delta Vídeo)": (
+        'get_comparison_data_delta',
+        "Gorgonoid Conteúdo (Delta por Vídeo)",
+        "ℹ️ **Metodologia Gorgonoid (Delta por Vídeo)**\n\n"
+        "Este ranking mede o **CRESCIMENTO** de views somando o delta de cada vídeo. "
+        "Para cada vídeo do canal (independente de quando foi publicado), calculamos: `views_fim - views_inicio`. "
+        "Reflete o desempenho real do conteúdo no período.\n\n"
+        "⚠️ Requer snapshots diários (aguarde 7+ dias após primeira coleta).",
+        False
+    ),
+    "📈 Análise de Views (Publicado)": (
+        'get_comparison_data',
+        "Análise de Views (Conteúdo Publicado)",
+        "ℹ️ **Análise de Views do Período (Conteúdo Publicado)**\n\n"
+        "Este ranking soma as visualizações **TOTAIS** de vídeos e shorts publicados no período. "
+        "Cada vídeo carrega suas views acumuladas desde a publicação até hoje. "
+        "Métrica de volume de produção.",
+        False
+    ),
+}
+
+
 def page_comparison():
     """Comparison page logic."""
     st.title("📈 Comparativo de Canais")
@@ -396,7 +617,7 @@ def page_comparison():
     st.sidebar.markdown("---")
     st.sidebar.header("📸 Snapshots de Vídeos")
     
-    snapshot_stats = db.get_snapshot_stats()
+    snapshot_stats = load_snapshot_stats(db)
     latest_snapshot = snapshot_stats['latest_date']
     
     if latest_snapshot:
@@ -408,20 +629,19 @@ def page_comparison():
     
     if st.sidebar.button("🔄 Coletar Snapshots Agora", help="Salvar view counts atuais de todos os vídeos"):
         with st.spinner("Coletando snapshots de todos os vídeos..."):
+            progress_bar = st.sidebar.progress(0)
             try:
-                result = collector.collect_snapshots_for_all_channels()
+                result = collector.collect_snapshots_for_all_channels(
+                    progress_callback=lambda done, total: progress_bar.progress(done / total)
+                )
                 st.sidebar.success(f"✅ Coletados {result['videos_snapshotted']:,} snapshots!")
-                st.cache_data.clear()
+                invalidate_caches(load_snapshot_stats, load_comparison, load_channel_details, load_channel_history)
                 st.rerun()
             except Exception as e:
                 st.sidebar.error(f"❌ Erro: {e}")
     
     # 1. Select Channels
-    cursor = db.conn.cursor()
-    cursor.execute("SELECT channel_id, title FROM channels ORDER BY title")
-    channels = cursor.fetchall()
-    
-    channel_options = {row['channel_id']: row['title'] for row in channels}
+    channel_options = load_channel_options(db)
     
     # Auto-select ALL channels
     selected_channels = list(channel_options.keys())
@@ -432,14 +652,7 @@ def page_comparison():
     
     with col1:
         # Monthly period selector
-        import calendar
-        now = pd.Timestamp.now()
-        
-        # Generate last 6 months options
-        month_options = ["Personalizado"]
-        for i in range(6):
-            date = now - pd.DateOffset(months=i)
-            month_options.append(f"{calendar.month_name[date.month]} {date.year}")
+        month_options = load_month_options(pd.Timestamp.now().strftime('%Y-%m'))
         
         preset = st.selectbox(
             "Período",
@@ -469,11 +682,7 @@ def page_comparison():
         # MODE SELECTOR (Triple Ranking System - Gorgonoid Complete)
         mode = st.radio(
             "**Metodologia:**",
-            options=[
-                "📊 Gorgonoid Canal (Delta Canal)",
-                "🎬 Gorgonoid Conteúdo (Delta Vídeo)",
-                "📈 Análise de Views (Publicado)"
-            ],
+            options=list(COMPARISON_MODES),
             index=0,  # Default to Delta Canal
             help="Canal (total), Conteúdo (vídeos), ou Views Publicadas"
         )
@@ -491,198 +700,70 @@ def page_comparison():
 
 
         # TRIPLE RANKING LOGIC
-        if "Canal" in mode:
-            # ============ MODO 1: DELTA CANAL (PLANILHA GORGONOID) ============
-            ranking_data = ranking.get_comparison_data_delta_channel(
-                selected_channels, 
-                start_date.strftime('%Y-%m-%d'), 
-                end_date.strftime('%Y-%m-%d')
-            )
-            
-            # Check if we have snapshot data
-            if ranking_data:
-                missing_count = sum(1 for r in ranking_data if r.get('missing_snapshots', False))
-                
-                if missing_count == len(ranking_data):
-                    st.error("⚠️ **Sem dados de snapshot de canal!**\n\nO modo Delta Canal requer snapshots diários. Clique em 'Coletar Snapshots Agora' e aguarde 1+ dia.")
-                    return
-                
-                if missing_count > 0:
-                    st.warning(f"⚠️ {missing_count}/{len(ranking_data)} canais sem snapshots completos")
-            
-            mode_name = "Gorgonoid Canal (Delta Canal)"
-            column_map = {
-                "ant": "Ant (Views Início)",
-                "atual": "Atual (Views Fim)",
-                "reais": "Reais (Crescimento)",
-                "percent": "% Crescimento"
-            }
-            explanation = (
-                "ℹ️ **Metodologia Gorgonoid (Delta Canal - Planilha)**\n\n"
-                "Este ranking usa o **viewCount total do canal** (da API oficial do YouTube). "
-                "Métricas:\n"
-                "- **Ant:** Views totais do canal no início do período\n"
-                "- **Atual:** Views totais do canal no fim do período\n"
-                "- **Reais:** Crescimento absoluto (Atual - Ant)\n"
-                "- **%:** Percentual de crescimento\n\n"
-                "⚠️ Requer snapshots diários (coletar primeiro snapshot, aguardar 1+ dia)."
-            )
-            use_delta_canal_columns = True
-            
-        elif "Conteúdo" in mode:
-            # ============ MODO 2: DELTA CONTEÚDO (SOMA DE VÍDEOS) ============
-            ranking_data = ranking.get_comparison_data_delta(
-                selected_channels, 
-                start_date.strftime('%Y-%m-%d'), 
-                end_date.strftime('%Y-%m-%d')
-            )
+        method_name, mode_name, explanation, use_delta_canal_columns = COMPARISON_MODES[mode]
+        ranking_data = load_comparison(
+            ranking,
+            method_name,
+            tuple(sorted(selected_channels)),  # selection order doesn't change the ranking; share one cache entry
+            start_date.strftime('%Y-%m-%d'),
+            end_date.strftime('%Y-%m-%d')
+        )
+
+        # Check if we have snapshot data
+        if ranking_data and method_name == 'get_comparison_data_delta_channel':
+            missing_count = sum(1 for r in ranking_data if r.get('missing_snapshots', False))
             
-            # Check if we have snapshot data
-            if ranking_data:
-                total_tracked = sum(r.get('videos_with_data', 0) for r in ranking_data)
-                total_skipped = sum(r.get('videos_skipped', 0) for r in ranking_data)
-                
-                if total_tracked == 0:
-                    st.error("⚠️ **Sem dados de snapshot de vídeos!**\n\nO Modo Conteúdo requer snapshots históricos. Clique em 'Coletar Snapshots Agora' e aguarde 7+ dias.")
-                    return
-                
-                st.caption(f"📊 Rastreando {total_tracked:,} vídeos | {total_skipped:,} vídeos sem snapshots completos")
+            if missing_count == len(ranking_data):
+                st.error("⚠️ **Sem dados de snapshot de canal!**\n\nO modo Delta Canal requer snapshots diários. Clique em 'Coletar Snapshots Agora' e aguarde 1+ dia.")
+                return
             
-            mode_name = "Gorgonoid Conteúdo (Delta por Vídeo)"
-            column_map = {
-                "views_shorts": "Crescimento Shorts",
-                "views_longos": "Crescimento Longos",
-                "views_totais": "Crescimento Total"
-            }
-            explanation = (
-                "ℹ️ **Metodologia Gorgonoid (Delta por Vídeo)**\n\n"
-                "Este ranking mede o **CRESCIMENTO** de views somando o delta de cada vídeo. "
-                "Para cada vídeo do canal (independente de quando foi publicado), calculamos: `views_fim - views_inicio`. "
-                "Reflete o desempenho real do conteúdo no período.\n\n"
-                "⚠️ Requer snapshots diários (aguarde 7+ dias após primeira coleta)."
-            )
-            use_delta_canal_columns = False
+            if missing_count > 0:
+                st.warning(f"⚠️ {missing_count}/{len(ranking_data)} canais sem snapshots completos")
+        elif ranking_data and method_name == 'get_comparison_data_delta':
+            total_tracked = sum(r.get('videos_with_data', 0) for r in ranking_data)
+            total_skipped = sum(r.get('videos_skipped', 0) for r in ranking_data)
             
-        else:
-            # ============ MODO 3: ANÁLISE DE VIEWS (CONTEÚDO PUBLICADO) ============
-            ranking_data = ranking.get_comparison_data(
-                selected_channels, 
-                start_date.strftime('%Y-%m-%d'), 
-                end_date.strftime('%Y-%m-%d')
-            )
+            if total_tracked == 0:
+                st.error("⚠️ **Sem dados de snapshot de vídeos!**\n\nO Modo Conteúdo requer snapshots históricos. Clique em 'Coletar Snapshots Agora' e aguarde 7+ dias.")
+                return
             
-            mode_name = "Análise de Views (Conteúdo Publicado)"
-            column_map = {
-                "views_shorts": "Views Shorts",
-                "views_longos": "Views Longos",
-                "views_totais": "Views Totais"
-            }
-            explanation = (
-                "ℹ️ **Análise de Views do Período (Conteúdo Publicado)**\n\n"
-                "Este ranking soma as visualizações **TOTAIS** de vídeos e shorts publicados no período. "
-                "Cada vídeo carrega suas views acumuladas desde a publicação até hoje. "
-                "Métrica de volume de produção."
-            )
-            use_delta_canal_columns = False
+            st.caption(f"📊 Rastreando {total_tracked:,} vídeos | {total_skipped:,} vídeos sem snapshots completos")
         
         if not ranking_data:
             st.warning("Nenhum dado encontrado. Verifique o período selecionado.")
             return
 
-        # Calculate statistics (Modes with Shorts/Longos breakdown)
-        if not use_delta_canal_columns:
-            df_calc = pd.DataFrame(ranking_data)
-            p75_efficiency = df_calc['media_por_conteudo'].quantile(0.75) if not df_calc.empty and 'media_por_conteudo' in df_calc.columns else 0
-            p75_volume = df_calc['total_videos'].quantile(0.75) if not df_calc.empty and 'total_videos' in df_calc.columns else 0
-            avg_efficiency = df_calc['media_por_conteudo'].mean() if not df_calc.empty and 'media_por_conteudo' in df_calc.columns else 0
-        else:
-            # Delta Canal doesn't need these stats
-            p75_efficiency = 0
-            p75_volume = 0
-            avg_efficiency = 0
-
-        # Helper to get logo path
-        def get_brand_logo(brand_name):
-            if not brand_name or brand_name in ['?', 'Sem Patrocínio']:
-                return ""
-                
-            safe_name = brand_name.lower().replace(" ", "_").replace(".", "")
-            logo_path = f"assets/logos/{safe_name}.png"
-            
-            # Check if exists (relative to current script execution)
-            if os.path.exists(logo_path):
-                # Using st.image directly in table is tricky, using base64 or serving static
-                # For simplicity in dataframe, we just return name. 
-                # But for custom table, we can return HTML img tag if using markdown
-                # Here we will try to just show the name with emoji first, or better yet
-                # We will render a custom HTML table or use st.dataframe with column config if available
-                return logo_path
-            return None
-
-        # Build display table
-        table_rows = []
-        for i, item in enumerate(ranking_data, 1):
-            row = {}
-            
-            # Column Order: Pos -> Marca -> Canal -> ...
-            row['#'] = i
-            
-            # Brand
-            brand = item.get('brand', '')
-            row['Marca'] = brand if brand else "-"
-            
-            # Channel
-            row['Canal'] = item.get('title', item.get('channel_id', 'Canal Desconhecido'))
-            
-            if use_delta_canal_columns:
-                # Delta Canal Columns
-                row['Ant'] = f"{item.get('ant', 0):,.0f}".replace(",", ".")
-                row['Atual'] = f"{item.get('atual', 0):,.0f}".replace(",", ".")
-                row['Reais'] = f"{item.get('reais', 0):,.0f}".replace(",", ".")
-                
-                pct = item.get('percent', 0)
-                color = "green" if pct > 0 else "red" if pct < 0 else "gray"
-                row['%'] = pct  # Keep raw for formatting later or pre-format
-                row['Formatted_%'] = f"{pct:+.2f}%"
+        df_calc = pd.DataFrame(ranking_data)
 
-            else:
-                # Content Columns - Separated Shorts and Longs
-                shorts_count = item.get('shorts_periodo', item.get('shorts_count', 0))
-                longs_count = item.get('longos_periodo', item.get('long_count', 0))
-                total_videos = item.get('total_videos', 0)
-                
-                row['Vídeos'] = total_videos
-                row['Shorts'] = shorts_count  # Separate column for short count
-                row['Longos'] = longs_count   # Separate column for long count
-
-                # Views Columns - define variables
-                views_sh = item.get('views_sh_periodo', item.get('shorts_views', 0))
-                views_lo = item.get('views_lo_periodo', item.get('long_views', 0))
-                views_total = item.get('views_total_periodo', item.get('views_period', 0))
-                
-                row['Views Shorts'] = f"{views_sh:,.0f}".replace(",", ".")
-                row['Views Longos'] = f"{views_lo:,.0f}".replace(",", ".")
-                row['Views Total'] = f"{views_total:,.0f}".replace(",", ".")
+        # Build display table (column-wise; Column Order: Pos -> Marca -> Canal -> ...)
+        df = pd.DataFrame({'#': np.arange(1, len(df_calc) + 1)}, index=df_calc.index)
+        df['Marca'] = coalesce_columns(df_calc, 'brand', default='').replace('', '-')
+        df['Canal'] = coalesce_columns(df_calc, 'title', 'channel_id', default='Canal Desconhecido')
 
-            table_rows.append(row)
+        if use_delta_canal_columns:
+            # Delta Canal Columns
+            df['Ant'] = format_thousands(coalesce_columns(df_calc, 'ant'))
+            df['Atual'] = format_thousands(coalesce_columns(df_calc, 'atual'))
+            df['Reais'] = format_thousands(coalesce_columns(df_calc, 'reais'))
+            df['%'] = coalesce_columns(df_calc, 'percent')  # Keep raw for ProgressColumn
+            df['Formatted_%'] = df['%'].map('{:+.2f}%'.format)
+        else:
+            # Content Columns - Separated Shorts and Longs
+            df['Vídeos'] = coalesce_columns(df_calc, 'total_videos').astype(int)
+            df['Shorts'] = coalesce_columns(df_calc, 'shorts_periodo', 'shorts_count').astype(int)
+            df['Longos'] = coalesce_columns(df_calc, 'longos_periodo', 'long_count').astype(int)
+            df['Views Shorts'] = format_thousands(coalesce_columns(df_calc, 'views_sh_periodo', 'shorts_views'))
+            df['Views Longos'] = format_thousands(coalesce_columns(df_calc, 'views_lo_periodo', 'long_views'))
+            df['Views Total'] = format_thousands(coalesce_columns(df_calc, 'views_total_periodo', 'views_period'))
             
         st.subheader(f"🏆 Ranking: {mode_name}")
         st.info(explanation)
         
         # Safety check
-        if not table_rows:
+        if df.empty:
             st.warning("⚠️ Nenhum dado para exibir. Verifique se há snapshots disponíveis para o período selecionado.")
             return
         
-        # Create DataFrame safely
-        try:
-            df = pd.DataFrame(table_rows)
-        except Exception as e:
-            st.error(f"❌ Erro ao criar tabela: {e}")
-            st.write("Debug - Dados recebidos:")
-            st.write(table_rows[:3] if len(table_rows) > 0 else "Vazio")
-            return
-        
         # Display logic
         if use_delta_canal_columns:
             st.dataframe(
@@ -730,6 +811,8 @@ def page_comparison():
 
 def main():
     """Main application."""
+    init_environment()
+    
     st.sidebar.title("Navegação")
     page = st.sidebar.radio("Ir para", ["🏆 Ranking Geral", "📈 Comparativo"], label_visibility="collapsed")
     
@@ -2,11 +2,47 @@
 Ranking calculations and queries.
 """
 import logging
-from typing import List, Dict, Optional
+import re
+from typing import List, Dict, Optional, Tuple
 import sqlite3
+import numpy as np
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# The trigram index needs 3+ characters; shorter terms use a substring scan instead
+MIN_FTS_QUERY_LEN = 3
+
+
+def _internal_metrics(totals: np.ndarray) -> Dict[str, list]:
+    """
+    Internal (non-displayed) comparison metrics, vectorized over channels.
+    
+    Args:
+        totals: int64 array of shape (n_channels, 4) with columns
+            shorts_views, long_views, shorts_count, long_count
+    
+    Returns:
+        Dict of metric name -> per-channel values (plain Python types)
+    """
+    shorts_views, long_views, shorts_count, long_count = totals.T.astype(np.float64)
+    total_views = shorts_views + long_views
+    total_videos = shorts_count + long_count
+    
+    def ratio(views, count):
+        return np.divide(views, count, out=np.zeros(len(totals)), where=count > 0).tolist()
+    
+    return {
+        # 1. Views Reais: Weighted views (longos * 1.0 + shorts * 0.25)
+        "views_reais": (long_views + shorts_views * 0.25).tolist(),
+        # 2. Efficiency Metrics
+        "media_por_conteudo": ratio(total_views, total_videos),
+        "media_shorts": ratio(shorts_views, shorts_count),
+        "media_longos": ratio(long_views, long_count),
+        # 3. Editorial Cut-off Flag (< 1M views)
+        "below_cutoff": (total_views < 1_000_000).tolist()
+    }
+
 
 class RankingEngine:
     """Ranking calculation engine."""
@@ -15,6 +51,32 @@ class RankingEngine:
         """Initialize with database connection."""
         self.db = database
     
+    def _title_filter(self, search_query: str = None) -> Tuple[str, list]:
+        """
+        Build the channel-title WHERE clause for a search term.
+        
+        Case-insensitive substring match anywhere in the title, like
+        LIKE '%term%'. Terms of MIN_FTS_QUERY_LEN+ characters are looked up
+        in the trigram channels_fts index as one quoted phrase. Shorter terms
+        have no full trigram, so they fall back to a scan. That scan uses
+        binary GLOB when the term has no letters and no LIKE wildcards
+        (same matches, no per-row case folding), LIKE otherwise.
+        
+        Returns:
+            (clause, params), both empty when there is no search term
+        """
+        if not search_query:
+            return "", []
+        
+        if len(search_query.strip()) < MIN_FTS_QUERY_LEN:
+            if search_query.lower() == search_query.upper() and not any(ch in search_query for ch in '%_'):
+                literal = re.sub(r"([*?\[])", r"[\1]", search_query)
+                return " WHERE c.title GLOB ?", [f"*{literal}*"]
+            return " WHERE c.title LIKE ?", [f"%{search_query}%"]
+        
+        match = '"{}"'.format(search_query.replace('"', '""'))
+        return " WHERE c.rowid IN (SELECT rowid FROM channels_fts WHERE channels_fts MATCH ?)", [match]
+    
     def get_global_ranking(self, limit: int = 100, offset: int = 0, 
                           search_query: str = None) -> List[Dict]:
         """
@@ -26,46 +88,45 @@ class RankingEngine:
             search_query: Optional search term for channel title
         
         Returns:
-            List of ranked channels with statistics
+            List of ranked channels with statistics. Every row also carries
+            'total_count', the number of channels matching the filter before
+            LIMIT/OFFSET, so callers don't need get_total_channels_count().
         """
         cursor = self.db.conn.cursor()
         
+        # Reads the precomputed channel_agg rows (kept current by Database.upsert_videos)
         query = """
             SELECT 
                 c.channel_id,
                 c.title,
                 c.handle,
                 c.brand,
-                SUM(v.last_view_count) as total_views,
-                SUM(CASE WHEN v.is_short = 1 THEN v.last_view_count ELSE 0 END) as shorts_views,
-                SUM(CASE WHEN v.is_short = 0 THEN v.last_view_count ELSE 0 END) as long_views,
-                COUNT(*) as total_videos,
-                SUM(v.is_short) as shorts_count,
-                SUM(CASE WHEN v.is_short = 0 THEN 1 ELSE 0 END) as long_count,
-                MAX(v.last_fetched_at) as last_update
-            FROM channels c
-            INNER JOIN videos v ON c.channel_id = v.channel_id
+                a.total_views,
+                a.shorts_views,
+                a.long_views,
+                a.total_videos,
+                a.shorts_count,
+                a.long_count,
+                a.last_update,
+                COUNT(*) OVER () as total_count
+            FROM channel_agg a
+            INNER JOIN channels c ON c.channel_id = a.channel_id
         """
         
-        params = []
-        
-        if search_query:
-            query += " WHERE c.title LIKE ?"
-            params.append(f"%{search_query}%")
+        clause, params = self._title_filter(search_query)
+        query += clause
         
         query += """
-            GROUP BY c.channel_id, c.title, c.handle, c.brand
-            ORDER BY total_views DESC
+            ORDER BY a.total_views DESC
             LIMIT ? OFFSET ?
         """
         
         params.extend([limit, offset])
         
         cursor.execute(query, params)
-        rows = cursor.fetchall()
         
         ranking = []
-        for i, row in enumerate(rows, start=offset + 1):
+        for i, row in enumerate(cursor, start=offset + 1):
             ranking.append({
                 'rank': i,
                 'channel_id': row['channel_id'],
@@ -78,7 +139,8 @@ class RankingEngine:
                 'total_videos': row['total_videos'] or 0,
                 'shorts_count': row['shorts_count'] or 0,
                 'long_count': row['long_count'] or 0,
-                'last_update': row['last_update']
+                'last_update': row['last_update'],
+                'total_count': row['total_count']
             })
         
         logger.debug(f"Retrieved {len(ranking)} channels for ranking")
@@ -92,16 +154,28 @@ class RankingEngine:
             channel_id: Channel ID
         
         Returns:
-            Channel details with top videos
+            Channel details with top videos and the latest snapshot audit
+            fields ('snapshot', None if the channel has no snapshots)
         """
         cursor = self.db.conn.cursor()
         
-        # Get channel info
+        # Get channel info + latest snapshot audit in one round trip
+        # (the subquery is a single seek on idx_snapshots_channel_latest)
         cursor.execute("""
-            SELECT channel_id, title, handle, country, brand
-            FROM channels
-            WHERE channel_id = ?
-        """, (channel_id,))
+            SELECT 
+                c.channel_id, c.title, c.handle, c.country, c.brand,
+                s.diff_percent, s.reported_channel_views,
+                s.total_views AS snap_total_views, s.snapshot_date
+            FROM channels c
+            LEFT JOIN (
+                SELECT channel_id, diff_percent, reported_channel_views, total_views, snapshot_date
+                FROM channel_snapshots
+                WHERE channel_id = ?
+                ORDER BY snapshot_date DESC
+                LIMIT 1
+            ) s USING (channel_id)
+            WHERE c.channel_id = ?
+        """, (channel_id, channel_id))
         
         channel_row = cursor.fetchone()
         if not channel_row:
@@ -111,35 +185,37 @@ class RankingEngine:
         # Get aggregated stats
         stats = self.db.get_channel_stats(channel_id)
         
-        # Get top video overall
+        # Top 10 videos and top Short in one index-only ranking pass;
+        # only the selected rows are joined back for title/published_at
         cursor.execute("""
-            SELECT video_id, title, last_view_count, is_short, published_at
-            FROM videos
-            WHERE channel_id = ?
-            ORDER BY last_view_count DESC
-            LIMIT 1
+            WITH ranked AS (
+                SELECT 
+                    video_id,
+                    is_short,
+                    ROW_NUMBER() OVER (ORDER BY last_view_count DESC) as rn_all,
+                    ROW_NUMBER() OVER (PARTITION BY is_short ORDER BY last_view_count DESC) as rn_type
+                FROM videos
+                WHERE channel_id = ?
+            )
+            SELECT v.video_id, v.title, v.last_view_count, v.is_short, v.published_at, r.rn_all
+            FROM ranked r
+            JOIN videos v ON v.video_id = r.video_id
+            WHERE r.rn_all <= 10 OR (r.is_short = 1 AND r.rn_type = 1)
+            ORDER BY r.rn_all
         """, (channel_id,))
-        top_video = cursor.fetchone()
         
-        # Get top Short
-        cursor.execute("""
-            SELECT video_id, title, last_view_count, published_at
-            FROM videos
-            WHERE channel_id = ? AND is_short = 1
-            ORDER BY last_view_count DESC
-            LIMIT 1
-        """, (channel_id,))
-        top_short = cursor.fetchone()
+        top_10_videos = []
+        top_short = None
+        for row in cursor:
+            video = dict(row)
+            rn_all = video.pop('rn_all')
+            if rn_all <= 10:
+                top_10_videos.append(video)
+            if top_short is None and video['is_short'] == 1:
+                top_short = {k: v for k, v in video.items() if k != 'is_short'}
         
-        # Get top 10 videos
-        cursor.execute("""
-            SELECT video_id, title, last_view_count, is_short, published_at
-            FROM videos
-            WHERE channel_id = ?
-            ORDER BY last_view_count DESC
-            LIMIT 10
-        """, (channel_id,))
-        top_10_videos = cursor.fetchall()
+        # Top video overall is the head of the top 10
+        top_video = top_10_videos[0] if top_10_videos else None
         
         return {
             'channel_id': channel_row['channel_id'],
@@ -148,12 +224,18 @@ class RankingEngine:
             'country': channel_row['country'],
             'brand': channel_row['brand'],
             'stats': stats,
-            'top_video': dict(top_video) if top_video else None,
-            'top_short': dict(top_short) if top_short else None,
-            'top_10_videos': [dict(row) for row in top_10_videos]
+            'top_video': top_video,
+            'top_short': top_short,
+            'top_10_videos': top_10_videos,
+            'snapshot': {
+                'diff_percent': channel_row['diff_percent'],
+                'reported_channel_views': channel_row['reported_channel_views'],
+                'total_views': channel_row['snap_total_views'],
+                'snapshot_date': channel_row['snapshot_date']
+            } if channel_row['snapshot_date'] else None
         }
     
-    def get_channel_history(self, channel_id: str, days: int = 30) -> List[Dict]:
+    def get_channel_history(self, channel_id: str, days: int = 30) -> pd.DataFrame:
         """
         Get historical snapshots for a channel.
         
@@ -162,42 +244,95 @@ class RankingEngine:
             days: Number of days of history to retrieve
         
         Returns:
-            List of historical snapshots
+            DataFrame of historical snapshots indexed by snapshot_date
+            (already parsed as datetimes, ascending)
+        """
+        with self.db.lock:
+            return pd.read_sql_query("""
+                SELECT 
+                    snapshot_date,
+                    total_views,
+                    shorts_views,
+                    long_views,
+                    total_videos,
+                    shorts_videos,
+                    long_videos
+                FROM channel_snapshots
+                WHERE channel_id = ?
+                  AND snapshot_date >= date('now', '-' || ? || ' days')
+                ORDER BY snapshot_date ASC
+            """, self.db.conn, params=(channel_id, days),
+                parse_dates=['snapshot_date'], index_col='snapshot_date')
+    
+    def get_total_channels_count(self, search_query: str = None) -> int:
+        """
+        Get total number of channels in database.
+        
+        Kept for callers that only need the count; get_global_ranking rows
+        already carry it as 'total_count'.
         """
         cursor = self.db.conn.cursor()
         
-        cursor.execute("""
-            SELECT 
-                snapshot_date,
-                total_views,
-                shorts_views,
-                long_views,
-                total_videos,
-                shorts_videos,
-                long_videos
-            FROM channel_snapshots
-            WHERE channel_id = ?
-              AND snapshot_date >= date('now', '-' || ? || ' days')
-            ORDER BY snapshot_date ASC
-        """, (channel_id, days))
+        query = "SELECT COUNT(*) FROM channel_agg a INNER JOIN channels c ON c.channel_id = a.channel_id"
+        clause, params = self._title_filter(search_query)
+        query += clause
         
-        rows = cursor.fetchall()
+        cursor.execute(query, params)
+        return cursor.fetchone()[0]
+
+    def get_global_totals(self, limit: int = -1, search_query: str = None) -> Dict:
+        """
+        Get summed views/videos/shorts over the top `limit` channels of the global ranking.
         
-        return [dict(row) for row in rows]
-    
-    def get_total_channels_count(self, search_query: str = None) -> int:
-        """Get total number of channels in database."""
+        Aggregated in SQLite over the same channel_agg ranking as get_global_ranking,
+        so the totals never require materializing the ranking rows in Python.
+        
+        Args:
+            limit: Number of top channels to include (-1 for all)
+            search_query: Optional search term for channel title
+        
+        Returns:
+            Dict with total_views, shorts_views, total_videos, shorts_count
+        """
         cursor = self.db.conn.cursor()
         
-        query = "SELECT COUNT(DISTINCT c.channel_id) FROM channels c INNER JOIN videos v ON c.channel_id = v.channel_id"
-        params = []
+        query = """
+            SELECT
+                COALESCE(SUM(total_views), 0) as total_views,
+                COALESCE(SUM(shorts_views), 0) as shorts_views,
+                COALESCE(SUM(total_videos), 0) as total_videos,
+                COALESCE(SUM(shorts_count), 0) as shorts_count
+            FROM (
+                SELECT a.total_views, a.shorts_views, a.total_videos, a.shorts_count
+                FROM channel_agg a
+                INNER JOIN channels c ON c.channel_id = a.channel_id
+        """
         
-        if search_query:
-            query += " WHERE c.title LIKE ?"
-            params.append(f"%{search_query}%")
+        clause, params = self._title_filter(search_query)
+        query += clause
+        
+        query += """
+                ORDER BY a.total_views DESC
+                LIMIT ?
+            )
+        """
+        
+        params.append(limit)
         
         cursor.execute(query, params)
-        return cursor.fetchone()[0]
+        return dict(cursor.fetchone())
+
+    @staticmethod
+    def _ids_cte(channel_ids: List[str]) -> Tuple[str, list]:
+        """
+        WITH clause listing the requested channels with their input position.
+        
+        LEFT JOINing from it keeps channels without data (one row each), and
+        ordering by ids.pos after the sort key breaks ties in input order.
+        """
+        values = ", ".join("(?, ?)" for _ in channel_ids)
+        params = [value for pos, channel_id in enumerate(channel_ids) for value in (pos, channel_id)]
+        return f"WITH ids(pos, channel_id) AS (VALUES {values})", params
 
     def get_comparison_data(self, channel_ids: List[str], start_date: str, end_date: str) -> List[Dict]:
         """
@@ -244,51 +379,44 @@ class RankingEngine:
         start_ts = f"{start_date}T00:00:00Z"
         end_ts = f"{end_date}T23:59:59Z"
 
-        for channel_id in channel_ids:
-            # query: Sum views and COUNT videos for videos published in range, split by type
-            # We use COALESCE to ensure 0 instead of NULL
-            cursor.execute("""
-                SELECT 
-                    SUM(CASE WHEN is_short = 1 THEN last_view_count ELSE 0 END) as shorts_views,
-                    SUM(CASE WHEN is_short = 0 THEN last_view_count ELSE 0 END) as long_views,
-                    SUM(CASE WHEN is_short = 1 THEN 1 ELSE 0 END) as shorts_count,
-                    SUM(CASE WHEN is_short = 0 THEN 1 ELSE 0 END) as long_count
-                FROM videos
-                WHERE channel_id = ?
-                  AND published_at >= ?
-                  AND published_at <= ?
-            """, (channel_id, start_ts, end_ts))
-            
-            row = cursor.fetchone()
-            
-            shorts_views = row['shorts_views'] if row and row['shorts_views'] else 0
-            long_views = row['long_views'] if row and row['long_views'] else 0
-            shorts_count = row['shorts_count'] if row and row['shorts_count'] else 0
-            long_count = row['long_count'] if row and row['long_count'] else 0
-            
+        # One GROUP BY for all channels: sum views and count videos published in range, split by type.
+        # Channels with no videos in range get a row of zeros; rows come back already ranked.
+        ids_cte, params = self._ids_cte(channel_ids)
+        cursor.execute(f"""
+            {ids_cte}
+            SELECT 
+                ids.channel_id,
+                COALESCE(c.title, ids.channel_id) as title,
+                c.brand,
+                SUM(CASE WHEN v.is_short = 1 THEN v.last_view_count ELSE 0 END) as shorts_views,
+                SUM(CASE WHEN v.is_short = 0 THEN v.last_view_count ELSE 0 END) as long_views,
+                SUM(CASE WHEN v.is_short = 1 THEN 1 ELSE 0 END) as shorts_count,
+                SUM(CASE WHEN v.is_short = 0 THEN 1 ELSE 0 END) as long_count
+            FROM ids
+            LEFT JOIN channels c ON c.channel_id = ids.channel_id
+            LEFT JOIN videos v ON v.channel_id = ids.channel_id
+              AND v.published_at >= ?
+              AND v.published_at <= ?
+            GROUP BY ids.pos
+            ORDER BY shorts_views + long_views DESC, ids.pos
+        """, [*params, start_ts, end_ts])
+        rows = cursor.fetchall()
+        
+        # Derived metrics computed for all channels at once
+        totals = np.array([
+            [row['shorts_views'], row['long_views'], row['shorts_count'], row['long_count']]
+            for row in rows
+        ], dtype=np.int64)
+        metrics = _internal_metrics(totals)
+        
+        for i, row in enumerate(rows):
+            channel_id = row['channel_id']
+            shorts_views, long_views, shorts_count, long_count = totals[i].tolist()
             total_views_period = shorts_views + long_views
             total_videos_period = shorts_count + long_count
             
-            # ========== INTERNAL METRICS (GORGONOID ENHANCEMENTS) ==========
-            
-            # 1. Views Reais: Weighted views (longos * 1.0 + shorts * 0.25)
-            views_reais = (long_views * 1.0) + (shorts_views * 0.25)
-            
-            # 2. Efficiency Metrics
-            media_por_conteudo = total_views_period / total_videos_period if total_videos_period > 0 else 0
-            media_shorts = shorts_views / shorts_count if shorts_count > 0 else 0
-            media_longos = long_views / long_count if long_count > 0 else 0
-            
-            # 3. Editorial Cut-off Flag (< 1M views)
-            below_cutoff = total_views_period < 1_000_000
-            
-            # ===============================================================
-            
-            # Get channel title and brand
-            cursor.execute("SELECT title, brand FROM channels WHERE channel_id = ?", (channel_id,))
-            ch_row = cursor.fetchone()
-            title = ch_row['title'] if ch_row else channel_id
-            brand = ch_row['brand'] if ch_row else None
+            # Channel title and brand (joined in the same query)
+            title, brand = row['title'], row['brand']
             
             results.append({
                 "channel_id": channel_id,
@@ -303,15 +431,8 @@ class RankingEngine:
                 "start_date": start_date,
                 "end_date": end_date,
                 # Internal metrics (not displayed as columns)
-                "views_reais": views_reais,
-                "media_por_conteudo": media_por_conteudo,
-                "media_shorts": media_shorts,
-                "media_longos": media_longos,
-                "below_cutoff": below_cutoff
+                **{name: values[i] for name, values in metrics.items()}
             })
-
-        # Sort by total views in period descending
-        results.sort(key=lambda x: x['views_period'], reverse=True)
         
         return results
     
@@ -346,74 +467,53 @@ class RankingEngine:
         cursor = self.db.conn.cursor()
         results = []
         
-        for channel_id in channel_ids:
-            # OPTIMIZED: Single query with JOIN to get both snapshots at once
-            cursor.execute("""
-                SELECT 
-                    v.video_id,
-                    v.is_short,
-                    vs_start.view_count as views_start,
-                    vs_end.view_count as views_end
-                FROM videos v
-                LEFT JOIN video_snapshots vs_start ON v.video_id = vs_start.video_id AND vs_start.snapshot_date = ?
-                LEFT JOIN video_snapshots vs_end ON v.video_id = vs_end.video_id AND vs_end.snapshot_date = ?
-                WHERE v.channel_id = ?
-            """, (start_date, end_date, channel_id))
-            
-            videos = cursor.fetchall()
-            
-            shorts_delta = 0
-            long_delta = 0
-            shorts_count = 0
-            long_count = 0
-            videos_with_data = 0
-            videos_skipped = 0
-            
-            for video in videos:
-                views_start = video['views_start']
-                views_end = video['views_end']
-                is_short = video['is_short']
-                
-                # Skip if we don't have both snapshots
-                if views_start is None or views_end is None:
-                    videos_skipped += 1
-                    continue
-                
-                # Calculate delta (clamp to 0 if negative - rare but possible)
-                delta = max(0, views_end - views_start)
-                
-                if is_short:
-                    shorts_delta += delta
-                    shorts_count += 1
-                else:
-                    long_delta += delta
-                    long_count += 1
-                
-                videos_with_data += 1
+        # One GROUP BY for all channels; only videos with both snapshots count,
+        # and negative deltas (rare but possible) are clamped to 0.
+        # Channels without videos get a row of zeros; rows come back already ranked.
+        ids_cte, params = self._ids_cte(channel_ids)
+        cursor.execute(f"""
+            {ids_cte}
+            SELECT 
+                ids.channel_id,
+                COALESCE(c.title, ids.channel_id) as title,
+                c.brand,
+                SUM(CASE WHEN v.is_short AND vs_end.view_count > vs_start.view_count
+                         THEN vs_end.view_count - vs_start.view_count ELSE 0 END) as shorts_delta,
+                SUM(CASE WHEN NOT v.is_short AND vs_end.view_count > vs_start.view_count
+                         THEN vs_end.view_count - vs_start.view_count ELSE 0 END) as long_delta,
+                SUM(CASE WHEN v.is_short AND vs_start.view_count IS NOT NULL
+                          AND vs_end.view_count IS NOT NULL THEN 1 ELSE 0 END) as shorts_count,
+                SUM(CASE WHEN NOT v.is_short AND vs_start.view_count IS NOT NULL
+                          AND vs_end.view_count IS NOT NULL THEN 1 ELSE 0 END) as long_count,
+                COUNT(v.video_id) as total_videos
+            FROM ids
+            LEFT JOIN channels c ON c.channel_id = ids.channel_id
+            LEFT JOIN videos v ON v.channel_id = ids.channel_id
+            LEFT JOIN video_snapshots vs_start ON v.video_id = vs_start.video_id AND vs_start.snapshot_date = ?
+            LEFT JOIN video_snapshots vs_end ON v.video_id = vs_end.video_id AND vs_end.snapshot_date = ?
+            GROUP BY ids.pos
+            ORDER BY shorts_delta + long_delta DESC, ids.pos
+        """, [*params, start_date, end_date])
+        rows = cursor.fetchall()
+        
+        # Derived metrics computed for all channels at once
+        totals = np.array([
+            [row['shorts_delta'], row['long_delta'], row['shorts_count'], row['long_count']]
+            for row in rows
+        ], dtype=np.int64)
+        metrics = _internal_metrics(totals)
+        
+        for i, row in enumerate(rows):
+            channel_id = row['channel_id']
+            shorts_delta, long_delta, shorts_count, long_count = totals[i].tolist()
+            videos_with_data = shorts_count + long_count
+            videos_skipped = row['total_videos'] - videos_with_data
             
             total_delta = shorts_delta + long_delta
             total_videos = shorts_count + long_count
             
-            # ========== INTERNAL METRICS (SAME AS BEFORE) ==========
-            
-            # 1. Views Reais: Weighted views (longos * 1.0 + shorts * 0.25)
-            views_reais = (long_delta * 1.0) + (shorts_delta * 0.25)
-            
-            # 2. Efficiency Metrics
-            media_por_conteudo = total_delta / total_videos if total_videos > 0 else 0
-            media_shorts = shorts_delta / shorts_count if shorts_count > 0 else 0
-            media_longos = long_delta / long_count if long_count > 0 else 0
-            
-            # 3. Editorial Cut-off Flag (< 1M views)
-            below_cutoff = total_delta < 1_000_000
-            
-            # ===========================================================
-            
-            # Get channel title and brand
-            cursor.execute("SELECT title, brand FROM channels WHERE channel_id = ?", (channel_id,))
-            ch_row = cursor.fetchone()
-            title = ch_row['title'] if ch_row else channel_id
-            brand = ch_row['brand'] if ch_row else None
+            # Channel title and brand (joined in the same query)
+            title, brand = row['title'], row['brand']
             
             results.append({
                 "channel_id": channel_id,
@@ -430,16 +530,9 @@ class RankingEngine:
                 "start_date": start_date,
                 "end_date": end_date,
                 # Internal metrics
-                "views_reais": views_reais,
-                "media_por_conteudo": media_por_conteudo,
-                "media_shorts": media_shorts,
-                "media_longos": media_longos,
-                "below_cutoff": below_cutoff
+                **{name: values[i] for name, values in metrics.items()}
             })
         
-        # Sort by total delta descending
-        results.sort(key=lambda x: x['views_period'], reverse=True)
-        
         logger.info(f"Delta ranking calculated for {len(results)} channels between {start_date} and {end_date}")
         
         return results
@@ -467,19 +560,36 @@ class RankingEngine:
         if not channel_ids:
             return []
         
-        cursor = self.db.conn.cursor()
         results = []
         
-        for channel_id in channel_ids:
-            # Get channel title and brand
-            cursor.execute("SELECT title, brand FROM channels WHERE channel_id = ?", (channel_id,))
-            ch_row = cursor.fetchone()
-            title = ch_row['title'] if ch_row else channel_id
-            brand = ch_row['brand'] if ch_row else None
+        # Start and end snapshots for all channels in one query, ranked by Reais descending
+        # (channels missing a snapshot rank as 0)
+        ids_cte, params = self._ids_cte(channel_ids)
+        cursor = self.db.conn.execute(f"""
+            {ids_cte}
+            SELECT 
+                ids.channel_id,
+                COALESCE(c.title, ids.channel_id) as title,
+                c.brand,
+                s_ant.reported_channel_views as views_ant,
+                s_atual.reported_channel_views as views_atual
+            FROM ids
+            LEFT JOIN channels c ON c.channel_id = ids.channel_id
+            LEFT JOIN channel_snapshots s_ant
+              ON s_ant.channel_id = ids.channel_id AND s_ant.snapshot_date = ?
+            LEFT JOIN channel_snapshots s_atual
+              ON s_atual.channel_id = ids.channel_id AND s_atual.snapshot_date = ?
+            ORDER BY MAX(0, COALESCE(views_atual - views_ant, 0)) DESC, ids.pos
+        """, [*params, start_date, end_date])
+        
+        for row in cursor:
+            channel_id = row['channel_id']
+            
+            # Channel title and brand (joined in the same query)
+            title, brand = row['title'], row['brand']
             
-            # Get channel snapshots for start and end dates
-            views_ant = self.db.get_channel_snapshot(channel_id, start_date)
-            views_atual = self.db.get_channel_snapshot(channel_id, end_date)
+            views_ant = row['views_ant']
+            views_atual = row['views_atual']
             
             # Skip if we don't have both snapshots
             if views_ant is None or views_atual is None:
@@ -516,8 +626,5 @@ class RankingEngine:
                 "end_date": end_date
             })
         
-        # Sort by Reais descending
-        results.sort(key=lambda x: x['reais'], reverse=True)
-        
         logger.info(f"Delta Canal ranking calculated for {len(results)} channels between {start_date} and {end_date}")
         return results
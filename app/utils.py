@@ -15,6 +15,9 @@ class ChannelLock:
     Uses filelock library which works on Windows, Linux, and Mac.
     """
     
+    # Lock directories already created by this process (mkdir once, not per lock)
+    _created_dirs = set()
+    
     def __init__(self, channel_id: str, lock_dir: str = "data/locks", timeout: int = 0):
         """
         Initialize channel lock.
@@ -26,7 +29,9 @@ class ChannelLock:
         """
         self.channel_id = channel_id
         self.lock_dir = Path(lock_dir)
-        self.lock_dir.mkdir(parents=True, exist_ok=True)
+        if lock_dir not in ChannelLock._created_dirs:
+            self.lock_dir.mkdir(parents=True, exist_ok=True)
+            ChannelLock._created_dirs.add(lock_dir)
         
         lockfile_path = self.lock_dir / f"{channel_id}.lock"
         self.lock = FileLock(str(lockfile_path), timeout=timeout)
@@ -57,18 +62,21 @@ def cleanup_old_locks(lock_dir: str = "data/locks", max_age_hours: int = 24):
     """
     import time
     
-    lock_path = Path(lock_dir)
-    if not lock_path.exists():
+    if not os.path.isdir(lock_dir):
         return
     
     current_time = time.time()
     max_age_seconds = max_age_hours * 3600
     
-    for lockfile in lock_path.glob("*.lock"):
-        try:
-            file_age = current_time - os.path.getmtime(lockfile)
-            if file_age > max_age_seconds:
-                lockfile.unlink()
-                logger.info(f"Removed stale lock file: {lockfile.name}")
-        except Exception as e:
-            logger.warning(f"Error cleaning lock file {lockfile}: {e}")
+    # scandir entries carry the directory listing, so each lock costs a single stat
+    with os.scandir(lock_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".lock"):
+                continue
+            try:
+                file_age = current_time - entry.stat().st_mtime
+                if file_age > max_age_seconds:
+                    os.unlink(entry.path)
+                    logger.info(f"Removed stale lock file: {entry.name}")
+            except Exception as e:
+                logger.warning(f"Error cleaning lock file {entry.path}: {e}")
@@ -3,57 +3,161 @@ YouTube Data API v3 client wrapper.
 """
 import time
 import random
+import hashlib
 import math
 import logging
 import isodate
 import re
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Iterator
+import orjson
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
 
 logger = logging.getLogger(__name__)
 
+# videos.list durations are plain PnDTnHnMnS; compiled once, isodate handles anything else
+_DURATION_RE = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+
+class OrjsonModel(JsonModel):
+    """JsonModel that parses API responses with orjson instead of the stdlib json module."""
+    
+    def deserialize(self, content):
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Non-JSON bodies (and anything orjson rejects) keep the stock behaviour
+            return super().deserialize(content)
+
 
 class RateLimiter:
-    """Rate limiter to avoid hitting YouTube API rate limits."""
+    """
+    Token-bucket rate limiter to avoid hitting YouTube API rate limits.
+    
+    Allows bursts of up to `burst` requests and refills at max_per_second, so
+    callers only wait once the bucket is empty (shared by all collector threads).
+    
+    The refill rate adapts AIMD-style: halved on every throttling response,
+    +1 req/s after each run of `increase_every` successes, up to the configured rate.
+    """
     
-    def __init__(self, max_per_second: int = 50):
+    def __init__(self, max_per_second: int = 50, burst: int = None,
+                 min_per_second: int = 5, increase_every: int = 10):
         self.max_per_second = max_per_second
-        self.last_request = 0
+        self.rate_cap = max_per_second
+        self.min_per_second = min(min_per_second, max_per_second)
+        self.increase_every = increase_every
+        self.burst = burst or max_per_second
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self._successes = 0
+        self._lock = threading.Lock()
     
     def wait_if_needed(self):
-        """Wait if necessary to respect rate limit."""
-        now = time.time()
-        time_since_last = now - self.last_request
-        min_interval = 1.0 / self.max_per_second
+        """Take a token, sleeping until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.max_per_second)
+            self.last_refill = now
+            # A negative balance reserves a future token; sleep outside the lock
+            self.tokens -= 1
+            wait_time = -self.tokens / self.max_per_second if self.tokens < 0 else 0
         
-        if time_since_last < min_interval:
-            time.sleep(min_interval - time_since_last)
-        
-        self.last_request = time.time()
+        if wait_time > 0:
+            time.sleep(wait_time)
+    
+    def record_success(self):
+        """Additive increase after `increase_every` consecutive successful requests."""
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.increase_every:
+                self._successes = 0
+                self.max_per_second = min(self.rate_cap, self.max_per_second + 1)
+    
+    def record_throttle(self):
+        """Multiplicative decrease after a 429/503 response."""
+        with self._lock:
+            self._successes = 0
+            self.max_per_second = max(self.min_per_second, self.max_per_second * 0.5)
 
 
 class YouTubeClient:
     """YouTube Data API v3 client."""
     
-    def __init__(self, api_key: str, rate_limit: int = 50):
-        """Initialize YouTube API client."""
+    def __init__(self, api_key: str, rate_limit: int = 50, cache=None, cache_ttl_days: int = 7,
+                 batch_workers: int = 4):
+        """
+        Initialize YouTube API client.
+        
+        Args:
+            api_key: YouTube Data API key
+            rate_limit: Max requests per second
+            cache: Optional store with get_api_cache/put_api_cache/prune_api_cache
+                   (e.g. Database) used for ETag revalidation of playlist pages
+            cache_ttl_days: Max age of a cached response before it is refetched;
+                            older entries are pruned from the cache on startup
+            batch_workers: videos.list batches fetched concurrently by get_videos_details
+        """
         self.api_key = api_key
-        self.youtube = build('youtube', 'v3', developerKey=api_key)
+        self.cache = cache
+        self.cache_ttl_days = cache_ttl_days
+        self._local = threading.local()
+        if cache is not None:
+            pruned = cache.prune_api_cache(cache_ttl_days)
+            if pruned:
+                logger.info(f"Pruned {pruned} expired API cache entries")
         self.rate_limiter = RateLimiter(max_per_second=rate_limit)
+        # Long-lived pool so each worker builds its thread-local API service only once
+        self._batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix='yt-videos')
         logger.info("YouTube API client initialized")
     
+    @property
+    def youtube(self):
+        """API service for the current thread (httplib2 connections are not thread-safe)."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = build('youtube', 'v3', developerKey=self.api_key, model=OrjsonModel())
+            self._local.service = service
+        return service
+    
+    def _resource(self, name: str):
+        """
+        Resource collection (videos, channels, ...) for the current thread.
+        
+        Each self.youtube.videos() call rebuilds the collection from the discovery
+        document (~2ms), more than building the request itself; reuse it instead.
+        """
+        resources = getattr(self._local, 'resources', None)
+        if resources is None:
+            resources = self._local.resources = {}
+        resource = resources.get(name)
+        if resource is None:
+            resource = resources[name] = getattr(self.youtube, name)()
+        return resource
+    
     def _api_request_with_retry(self, request_func, max_retries: int = 5):
         """Execute API request with exponential backoff retry."""
         for attempt in range(max_retries):
             try:
                 self.rate_limiter.wait_if_needed()
-                return request_func.execute()
+                response = request_func.execute()
+                self.rate_limiter.record_success()
+                return response
             except HttpError as e:
                 if e.resp.status in [429, 503]:
-                    wait_time = (2 ** attempt) + random.uniform(0, 1)
+                    self.rate_limiter.record_throttle()
+                    # Prefer the server's Retry-After (seconds) over our own backoff
+                    wait_time = self._retry_after(e)
+                    if wait_time is None:
+                        wait_time = (2 ** attempt) + random.uniform(0, 1)
                     logger.warning(f"Rate limit hit. Waiting {wait_time:.1f}s... (attempt {attempt + 1}/{max_retries})")
                     time.sleep(wait_time)
+                elif e.resp.status == 304:
+                    # Not Modified: caller revalidated a cached response
+                    raise
                 elif e.resp.status == 403 and 'quotaExceeded' in str(e):
                     logger.error("Daily quota exceeded. Aborting.")
                     raise
@@ -63,6 +167,57 @@ class YouTubeClient:
         
         raise Exception(f"Max retries ({max_retries}) reached")
     
+    @staticmethod
+    def _retry_after(error: HttpError) -> Optional[float]:
+        """Retry-After delay in seconds from an HttpError response, if present and numeric."""
+        try:
+            return max(0.0, float(error.resp.get('retry-after')))
+        except (TypeError, ValueError, AttributeError):
+            return None
+    
+    def _cached_request(self, request, cache_key: str) -> Dict:
+        """
+        Execute a request, revalidating a locally cached response with If-None-Match.
+        
+        A 304 reply has no body and does not count toward quota, so the cached
+        response is reused as-is.
+        """
+        if self.cache is None:
+            return self._api_request_with_retry(request)
+        
+        cached = self.cache.get_api_cache(cache_key, self.cache_ttl_days)
+        if cached:
+            request.headers['If-None-Match'] = cached[0]
+        
+        try:
+            response = self._api_request_with_retry(request)
+        except HttpError as e:
+            if cached and e.resp.status == 304:
+                logger.debug(f"Cache hit (304) for {cache_key}")
+                self.cache.put_api_cache(cache_key, cached[0], cached[1])
+                return cached[1]
+            raise
+        
+        if response.get('etag'):
+            self.cache.put_api_cache(cache_key, response['etag'], response)
+        return response
+    
+    def _stored_request(self, request, cache_key: str, max_age_days: int) -> Dict:
+        """
+        Execute a request unless a response younger than max_age_days is cached.
+        
+        Unlike _cached_request there is no revalidation round trip: a cache hit
+        costs no request at all, so use it only where stale data is acceptable.
+        """
+        cached = self.cache.get_api_cache(cache_key, max_age_days)
+        if cached:
+            logger.debug(f"Cache hit for {cache_key}")
+            return cached[1]
+        
+        response = self._api_request_with_retry(request)
+        self.cache.put_api_cache(cache_key, response.get('etag', ''), response)
+        return response
+    
     def resolve_channel_id(self, input_str: str) -> Optional[str]:
         """
         Resolve channel ID from various input formats:
@@ -73,14 +228,14 @@ class YouTubeClient:
         input_str = input_str.strip()
         
         # Direct channel ID
-        if input_str.startswith('UC') and len(input_str) == 24:
+        if self.is_channel_id(input_str):
             return input_str
         
         # Handle (@username)
         if input_str.startswith('@'):
             handle = input_str[1:]
             try:
-                request = self.youtube.channels().list(
+                request = self._resource('channels').list(
                     part='id',
                     forHandle=handle
                 )
@@ -94,7 +249,7 @@ class YouTubeClient:
                 # Fallback for libraries that don't support forHandle yet
                 logger.warning(f"forHandle not supported by client, falling back to search for @{handle}")
                 try:
-                    request = self.youtube.search().list(
+                    request = self._resource('search').list(
                         part='snippet',
                         q=f"@{handle}",
                         type='channel',
@@ -130,7 +285,7 @@ class YouTubeClient:
     def get_channel_metadata(self, channel_id: str) -> Optional[Dict]:
         """Get channel metadata and uploads playlist ID."""
         try:
-            request = self.youtube.channels().list(
+            request = self._resource('channels').list(
                 part='snippet,contentDetails,statistics',
                 id=channel_id
             )
@@ -140,20 +295,7 @@ class YouTubeClient:
                 logger.warning(f"Channel {channel_id} not found")
                 return None
             
-            item = response['items'][0]
-            snippet = item['snippet']
-            content_details = item['contentDetails']
-            statistics = item.get('statistics', {})
-            
-            metadata = {
-                'channel_id': channel_id,
-                'title': snippet['title'],
-                'handle': snippet.get('customUrl', None),
-                'country': snippet.get('country', None),
-                'uploads_playlist_id': content_details['relatedPlaylists']['uploads'],
-                'video_count': int(statistics.get('videoCount', 0)),
-                'view_count': int(statistics.get('viewCount', 0))
-            }
+            metadata = self._parse_channel_item(response['items'][0])
             
             logger.info(f"Got metadata for channel: {metadata['title']} ({metadata['video_count']} videos)")
             return metadata
@@ -162,13 +304,67 @@ class YouTubeClient:
             logger.error(f"Error getting channel metadata for {channel_id}: {e}")
             return None
     
+    def get_channels_metadata(self, channel_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Get metadata for many channels, 50 IDs per channels.list request.
+        
+        Returns:
+            Dict of channel_id -> metadata (same shape as get_channel_metadata);
+            channels that were not found are omitted
+        """
+        metadata = {}
+        
+        # Split into batches of 50 (channels.list accepts up to 50 comma-separated IDs)
+        for i in range(0, len(channel_ids), 50):
+            batch = channel_ids[i:i+50]
+            
+            try:
+                request = self._resource('channels').list(
+                    part='snippet,contentDetails,statistics',
+                    id=','.join(batch),
+                    maxResults=50
+                )
+                response = self._api_request_with_retry(request)
+                
+                for item in response.get('items', []):
+                    channel = self._parse_channel_item(item)
+                    metadata[channel['channel_id']] = channel
+                
+            except Exception as e:
+                logger.error(f"Error getting channel metadata for batch starting at {i}: {e}")
+        
+        logger.info(f"Got metadata for {len(metadata)}/{len(channel_ids)} channels")
+        return metadata
+    
+    @staticmethod
+    def _parse_channel_item(item: Dict) -> Dict:
+        """Parse a channels.list item (snippet, contentDetails, statistics) into channel metadata."""
+        snippet = item['snippet']
+        content_details = item['contentDetails']
+        statistics = item.get('statistics', {})
+        
+        return {
+            'channel_id': item['id'],
+            'title': snippet['title'],
+            'handle': snippet.get('customUrl', None),
+            'country': snippet.get('country', None),
+            'uploads_playlist_id': content_details['relatedPlaylists']['uploads'],
+            'video_count': int(statistics.get('videoCount', 0)),
+            'view_count': int(statistics.get('viewCount', 0))
+        }
+    
+    @staticmethod
+    def is_channel_id(input_str: str) -> bool:
+        """Whether the input is already a channel ID (UC + 22 characters)."""
+        return input_str.startswith('UC') and len(input_str) == 24
+    
     def get_channel_statistics(self, channel_id: str) -> Optional[Dict]:
         """
         Get channel statistics for snapshot collection.
         Returns view_count, subscriber_count, and video_count.
         """
         try:
-            request = self.youtube.channels().list(
+            request = self._resource('channels').list(
                 part='statistics',
                 id=channel_id
             )
@@ -190,70 +386,114 @@ class YouTubeClient:
             logger.error(f"Error getting channel statistics for {channel_id}: {e}")
             return None
     
-    def get_all_video_ids(self, uploads_playlist_id: str) -> List[str]:
-        """Get all video IDs from uploads playlist with pagination."""
-        video_ids = []
+    def iter_video_id_pages(self, uploads_playlist_id: str) -> Iterator[List[str]]:
+        """
+        Yield video IDs from the uploads playlist one page (up to 50) at a time.
+        
+        Uploads playlists are ordered newest first, so callers that only need
+        recent videos can stop iterating early and skip the remaining requests.
+        """
         next_page_token = None
         page_count = 0
         
         while True:
             try:
-                request = self.youtube.playlistItems().list(
+                request = self._resource('playlistItems').list(
                     part='contentDetails',
                     playlistId=uploads_playlist_id,
                     maxResults=50,
-                    pageToken=next_page_token
+                    pageToken=next_page_token,
+                    fields='etag,nextPageToken,items/contentDetails/videoId'
+                )
+                response = self._cached_request(
+                    request, f"playlistItems:{uploads_playlist_id}:{next_page_token or ''}"
                 )
-                response = self._api_request_with_retry(request)
-                
-                page_count += 1
-                items = response.get('items', [])
-                
-                for item in items:
-                    video_id = item['contentDetails']['videoId']
-                    video_ids.append(video_id)
-                
-                logger.debug(f"Page {page_count}: collected {len(items)} videos (total: {len(video_ids)})")
-                
-                next_page_token = response.get('nextPageToken')
-                if not next_page_token:
-                    break
-                    
             except Exception as e:
-                logger.error(f"Error getting video IDs (page {page_count}): {e}")
-                break
+                logger.error(f"Error getting video IDs (page {page_count + 1}): {e}")
+                return
+            
+            page_count += 1
+            page = [item['contentDetails']['videoId'] for item in response.get('items', [])]
+            logger.debug(f"Page {page_count}: collected {len(page)} videos")
+            yield page
+            
+            next_page_token = response.get('nextPageToken')
+            if not next_page_token:
+                return
+    
+    def get_all_video_ids(self, uploads_playlist_id: str) -> List[str]:
+        """Get all video IDs from uploads playlist with pagination."""
+        video_ids = []
+        for page in self.iter_video_id_pages(uploads_playlist_id):
+            video_ids.extend(page)
         
         logger.info(f"Collected {len(video_ids)} video IDs from playlist {uploads_playlist_id}")
         return video_ids
     
-    def get_videos_details(self, video_ids: List[str]) -> List[Dict]:
-        """Get video details in batches of 50."""
+    def get_videos_details(self, video_ids: List[str], fields: str = None,
+                           max_age_days: int = 0) -> List[Dict]:
+        """
+        Get video details in batches of 50.
+        
+        Batches are fetched concurrently on the client's batch pool (still gated by
+        the shared rate limiter); results keep the order of video_ids.
+        
+        Args:
+            video_ids: Video IDs to fetch
+            fields: Optional partial-response mask (e.g. 'items(id,statistics/viewCount)')
+                    for callers that only need a few fields; missing parts get defaults
+            max_age_days: When > 0 and the client has a cache, reuse stored batch
+                          responses up to this age without any request (for callers
+                          that only need immutable fields such as duration)
+        """
         all_videos = []
         
         # Split into batches of 50
-        for i in range(0, len(video_ids), 50):
-            batch = video_ids[i:i+50]
-            
-            try:
-                request = self.youtube.videos().list(
-                    part='snippet,contentDetails,statistics',
-                    id=','.join(batch)
-                )
-                response = self._api_request_with_retry(request)
-                
-                for item in response.get('items', []):
-                    video_data = self._parse_video_item(item)
-                    if video_data:
-                        all_videos.append(video_data)
-                
-                logger.debug(f"Processed batch {i//50 + 1}: {len(batch)} videos")
-                
-            except Exception as e:
-                logger.error(f"Error getting video details for batch starting at {i}: {e}")
+        starts = range(0, len(video_ids), 50)
+        batches = [video_ids[i:i+50] for i in starts]
+        
+        if len(batches) > 1:
+            batch_results = self._batch_executor.map(
+                lambda batch, i: self._get_videos_batch(batch, i, fields, max_age_days), batches, starts
+            )
+        else:
+            batch_results = map(lambda batch, i: self._get_videos_batch(batch, i, fields, max_age_days), batches, starts)
+        
+        for videos in batch_results:
+            all_videos.extend(videos)
         
         logger.info(f"Collected details for {len(all_videos)}/{len(video_ids)} videos")
         return all_videos
     
+    def _get_videos_batch(self, batch: List[str], start: int, fields: str = None,
+                          max_age_days: int = 0) -> List[Dict]:
+        """Fetch and parse one videos.list batch (up to 50 IDs); errors are logged and yield []."""
+        try:
+            request_kwargs = {'part': 'snippet,contentDetails,statistics', 'id': ','.join(batch)}
+            if fields:
+                request_kwargs['fields'] = fields
+            request = self._resource('videos').list(**request_kwargs)
+            
+            if max_age_days > 0 and self.cache is not None:
+                # Same IDs in any order share an entry
+                digest = hashlib.blake2b(','.join(sorted(batch)).encode(), digest_size=16).hexdigest()
+                response = self._stored_request(request, f"videos:{fields or ''}:{digest}", max_age_days)
+            else:
+                response = self._api_request_with_retry(request)
+            
+            videos = []
+            for item in response.get('items', []):
+                video_data = self._parse_video_item(item)
+                if video_data:
+                    videos.append(video_data)
+            
+            logger.debug(f"Processed batch {start//50 + 1}: {len(batch)} videos")
+            return videos
+            
+        except Exception as e:
+            logger.error(f"Error getting video details for batch starting at {start}: {e}")
+            return []
+    
     def _parse_video_item(self, item: Dict) -> Optional[Dict]:
         """Parse video item from API response."""
         try:
@@ -270,8 +510,7 @@ class YouTubeClient:
             # Parse duration
             duration_str = content_details.get('duration', 'PT0S')
             try:
-                duration = isodate.parse_duration(duration_str)
-                duration_seconds = int(duration.total_seconds())
+                duration_seconds = self._parse_duration_seconds(duration_str)
             except Exception as e:
                 logger.error(f"Error parsing duration '{duration_str}' for video {video_id}: {e}")
                 duration_seconds = 0
@@ -297,6 +536,15 @@ class YouTubeClient:
             logger.error(f"Error parsing video item {item.get('id', 'unknown')}: {e}")
             return None
     
+    @staticmethod
+    def _parse_duration_seconds(duration_str: str) -> int:
+        """Parse an ISO 8601 duration into whole seconds (regex fast path, isodate fallback)."""
+        match = _DURATION_RE.fullmatch(duration_str)
+        if match and duration_str not in ('P', 'PT') and not duration_str.endswith('T'):
+            days, hours, minutes, seconds = (int(part) if part else 0 for part in match.groups())
+            return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+        return int(isodate.parse_duration(duration_str).total_seconds())
+    
     @staticmethod
     def _classify_video_score(duration: int, snippet: Dict) -> tuple:
         """
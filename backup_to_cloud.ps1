@@ -47,8 +47,8 @@ if (-not $cloudPath) {
     Write-Host ""
     Write-Host "2. Use OneDrive (já instalado no Windows)" -ForegroundColor White
     Write-Host ""
-    Write-Host "3. Copie manualmente:" -ForegroundColor White
-    Write-Host "   De: data\rankings.db" -ForegroundColor Gray
+    Write-Host "3. Copie manualmente (com o dashboard e a coleta parados):" -ForegroundColor White
+    Write-Host "   De: data\rankings.db (e data\rankings.db-wal, se existir)" -ForegroundColor Gray
     Write-Host "   Para: Sua pasta de nuvem preferida" -ForegroundColor Gray
     Write-Host ""
     pause
@@ -69,11 +69,36 @@ Write-Host ""
 $timestamp = Get-Date -Format "yyyy-MM-dd_HHmm"
 $backupFile = "$backupDir\rankings_backup_$timestamp.db"
 
-# Copiar arquivo
+# Procurar Python (o backup usa a API de backup do SQLite)
+$pythonPaths = @(
+    "venv\Scripts\python.exe",
+    ".venv\Scripts\python.exe",
+    (Get-Command python -ErrorAction SilentlyContinue).Source
+)
+
+$pythonExe = $null
+foreach ($path in $pythonPaths) {
+    if ($path -and (Test-Path $path)) {
+        $pythonExe = $path
+        break
+    }
+}
+
+# Copiar banco de dados
+# O banco usa WAL: paginas ja gravadas podem estar so em rankings.db-wal, entao
+# copiar apenas rankings.db pode gerar um backup desatualizado ou corrompido.
+# A API de backup do SQLite gera uma copia consistente, inclusive com o app rodando.
 Write-Host "Copiando banco de dados..." -ForegroundColor Yellow
 
 try {
-    Copy-Item "data\rankings.db" $backupFile -Force
+    if (-not $pythonExe) {
+        throw "Python nao encontrado (necessario para copiar o banco com seguranca)"
+    }
+    
+    & $pythonExe -c 'import sqlite3, sys; src = sqlite3.connect(sys.argv[1]); dst = sqlite3.connect(sys.argv[2]); src.backup(dst); dst.close(); src.close()' "data\rankings.db" $backupFile
+    if ($LASTEXITCODE -ne 0) {
+        throw "Falha no backup do SQLite (codigo $LASTEXITCODE)"
+    }
     
     $size = (Get-Item $backupFile).Length / 1MB
     
@@ -1,5 +1,8 @@
 from app.db import Database
+import itertools
 import logging
+from operator import itemgetter
+import numpy as np
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -9,69 +12,47 @@ def fix_monotonicity():
     db = Database()
     cursor = db.conn.cursor()
     
-    # Get all channels
-    cursor.execute("SELECT channel_id, title FROM channels")
-    channels = cursor.fetchall()
+    # Get all snapshots, grouped by channel and sorted by date.
+    # Use reported if available, else total, else 0
+    cursor.execute("""
+        SELECT 
+            s.channel_id,
+            c.title,
+            s.snapshot_date,
+            s.reported_channel_views,
+            COALESCE(NULLIF(s.reported_channel_views, 0), s.total_views, 0) AS current_val
+        FROM channel_snapshots s
+        JOIN channels c ON c.channel_id = s.channel_id
+        ORDER BY s.channel_id, s.snapshot_date ASC
+    """)
+    rows = cursor.fetchall()
     
     total_updates = 0
+    updates = []
     
-    for channel in channels:
-        cid = channel['channel_id']
-        title = channel['title']
+    for (cid, title), snapshots in itertools.groupby(rows, key=itemgetter('channel_id', 'title')):
+        snapshots = list(snapshots)
         logger.info(f"Processing {title}...")
         
-        # Get snapshots sorted by date
-        cursor.execute("""
-            SELECT snapshot_date, reported_channel_views, total_views 
-            FROM channel_snapshots 
-            WHERE channel_id = ? 
-            ORDER BY snapshot_date ASC
-        """, (cid,))
+        # Enforce monotonicity: a drop is clamped to the running max
+        # (in a real scenario we might interpolate, but here we just clamp)
+        values = np.array([snap['current_val'] for snap in snapshots], dtype=np.int64)
+        fixed = np.maximum.accumulate(values)
+        updates_for_channel = int(np.count_nonzero(fixed != values))
         
-        snapshots = cursor.fetchall()
-        if not snapshots:
-            continue
-            
-        max_views = 0
-        updates_for_channel = 0
-        
-        for snap in snapshots:
-            # Use reported if available, else total, else 0
-            current_val = snap['reported_channel_views']
-            if current_val is None or current_val == 0:
-                current_val = snap['total_views'] or 0
-                
-            # Enforce monotonicity
-            if current_val < max_views:
-                # FIX: It dropped! Force it to be at least max_views
-                # In a real scenario we might interpolate, but here we just clamp
-                new_val = max_views
-                
-                cursor.execute("""
-                    UPDATE channel_snapshots 
-                    SET reported_channel_views = ? 
-                    WHERE channel_id = ? AND snapshot_date = ?
-                """, (new_val, cid, snap['snapshot_date']))
-                updates_for_channel += 1
-            else:
-                new_val = current_val
-                # Only update max_views if we have a valid positive number
-                if new_val > 0:
-                    max_views = new_val
-                    
-                # Ensure reported is populated if it was null
-                if snap['reported_channel_views'] != new_val:
-                    cursor.execute("""
-                        UPDATE channel_snapshots 
-                        SET reported_channel_views = ? 
-                        WHERE channel_id = ? AND snapshot_date = ?
-                    """, (new_val, cid, snap['snapshot_date']))
+        # Write clamped values, and populate reported where it was null/0
+        updates.extend(
+            (new_val, cid, snap['snapshot_date'])
+            for snap, new_val in zip(snapshots, fixed.tolist())
+            if snap['reported_channel_views'] != new_val
+        )
 
         if updates_for_channel > 0:
             logger.info(f"  Fixed {updates_for_channel} non-monotonic/missing records for {title}")
             total_updates += updates_for_channel
-            
-    db.conn.commit()
+    
+    # One BEGIN IMMEDIATE ... COMMIT (rolled back on error) instead of implicit transactions
+    db.bulk_update_reported_views(updates)
     logger.info(f"Done! Total records updated: {total_updates}")
     db.close()
 
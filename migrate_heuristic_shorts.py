@@ -6,7 +6,6 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.db import Database
 from app.youtube_client import YouTubeClient
-from app.config import Config
 import logging
 
 # Configure logging
@@ -16,67 +15,50 @@ logger = logging.getLogger(__name__)
 def migrate_heuristic():
     """
     Re-classify ALL videos using Heuristic Scoring (2025).
+    
+    The scoring only needs the stored duration, so this runs locally:
+    no API key, no quota.
     """
     db = Database()
     
-    api_key = Config.YOUTUBE_API_KEY
-    if not api_key:
-        logger.error("No API Key found.")
-        return
-        
-    client = YouTubeClient(api_key)
-    
-    # 1. Get ALL video IDs (to correct both Long->Short and Short->Long)
+    # 1. Get ALL videos (to correct both Long->Short and Short->Long)
     cursor = db.conn.cursor()
-    cursor.execute("SELECT video_id, title, is_short FROM videos")
+    cursor.execute("SELECT video_id, channel_id, duration_seconds, is_short FROM videos")
     rows = cursor.fetchall()
     
-    video_ids = [row['video_id'] for row in rows]
-    total_videos = len(video_ids)
-    
+    total_videos = len(rows)
     logger.info(f"Starting Heuristic Migration for {total_videos} videos...")
     
-    if not video_ids:
+    if not rows:
         return
 
-    updated_count = 0
     swapped_to_short = 0
     swapped_to_long = 0
+    videos_to_save = []
     
-    BATCH_SIZE = 50
+    for row in rows:
+        is_short, _, _ = YouTubeClient._classify_video_score(row['duration_seconds'], {})
+        new_is_short = 1 if is_short else 0
+        
+        if new_is_short != row['is_short']:
+            videos_to_save.append({
+                'video_id': row['video_id'],
+                'channel_id': row['channel_id'],
+                'duration_seconds': row['duration_seconds'],
+                'is_short': new_is_short
+            })
+            if new_is_short:
+                swapped_to_short += 1
+            else:
+                swapped_to_long += 1
     
-    for i in range(0, total_videos, BATCH_SIZE):
-        batch = video_ids[i:i+BATCH_SIZE]
-        try:
-            # get_videos_details now uses the NEW Scoring logic internally
-            video_details = client.get_videos_details(batch)
-            
-            videos_to_save = []
-            
-            for vid in video_details:
-                # Check if classification changed (we don't have old score, just old is_short)
-                # We need to look up the old value.
-                # Inefficeint to look up one by one.
-                # But we can just upsert all.
-                
-                # For logging stats:
-                # Find old row?
-                # Let's just track how many are Short in the new batch vs old?
-                # Too complex, just save.
-                videos_to_save.append(vid)
-                
-            if videos_to_save:
-                db.upsert_videos(videos_to_save)
-                updated_count += len(videos_to_save)
-            
-            logger.info(f"Processed {min(i + BATCH_SIZE, total_videos)}/{total_videos} videos.")
-            
-        except Exception as e:
-            logger.error(f"Error processing batch {i}: {e}")
+    # 2. One batched write for every changed video
+    db.update_video_classification(videos_to_save)
             
     logger.info("-" * 30)
     logger.info(f"MIGRATION COMPLETE.")
-    logger.info(f"Re-processed {updated_count} videos with Scoring Logic.")
+    logger.info(f"Re-classified {len(videos_to_save)}/{total_videos} videos with Scoring Logic.")
+    logger.info(f"Long -> Short: {swapped_to_short} | Short -> Long: {swapped_to_long}")
     logger.info("-" * 30)
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import sys
 import os
+import argparse
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -14,7 +15,7 @@ import time
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-def migrate_shorts():
+def migrate_shorts(use_cache: bool = True):
     """
     Migrate existing videos to new Shorts definition (<= 180s).
     Since DB doesn't store duration, we must re-fetch details from API.
@@ -27,7 +28,9 @@ def migrate_shorts():
         logger.error("No API Key found.")
         return
         
-    client = YouTubeClient(api_key)
+    # Durations don't change, so re-runs can reuse stored videos.list responses
+    client = YouTubeClient(api_key, cache=db if use_cache else None, cache_ttl_days=Config.CACHE_TTL_DAYS)
+    cache_days = Config.CACHE_TTL_DAYS if use_cache else 0
     
     # 1. Get all videos currently marked as LONG (is_short = 0)
     cursor = db.conn.cursor()
@@ -45,6 +48,9 @@ def migrate_shorts():
 
     updated_count = 0
     BATCH_SIZE = 50
+    # Classification only needs these; channelId lets the ranking aggregates be refreshed.
+    # Also keeps the cached responses small (no full snippets/descriptions)
+    CACHE_FIELDS = 'items(id,snippet/channelId,contentDetails/duration,statistics/viewCount)'
     
     # 2. Process in batches
     for i in range(0, total_videos, BATCH_SIZE):
@@ -53,7 +59,10 @@ def migrate_shorts():
         try:
             # Fetch details (this returns parsed 'duration_seconds' and new 'is_short')
             # The client code is already updated to use 180s threshold!
-            video_details = client.get_videos_details(batch)
+            if use_cache:
+                video_details = client.get_videos_details(batch, fields=CACHE_FIELDS, max_age_days=cache_days)
+            else:
+                video_details = client.get_videos_details(batch)
             
             videos_to_update = []
             for vid in video_details:
@@ -74,7 +83,11 @@ def migrate_shorts():
                 videos_to_update.append(vid)
 
             if videos_to_update:
-                db.upsert_videos(videos_to_update)
+                if use_cache:
+                    # Cached responses may carry old view counts: only touch classification
+                    db.update_video_classification(videos_to_update)
+                else:
+                    db.upsert_videos(videos_to_update)
                 updated_count += len([v for v in videos_to_update if v['is_short'] == 1])
                 logger.info(f"Processed {i + len(batch)}/{total_videos} videos... (Saved: {len(videos_to_update)})")
             
@@ -87,4 +100,8 @@ def migrate_shorts():
     logger.info("-" * 30)
 
 if __name__ == "__main__":
-    migrate_shorts()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always refetch videos.list instead of reusing cached responses')
+    args = parser.parse_args()
+    migrate_shorts(use_cache=not args.no_cache)
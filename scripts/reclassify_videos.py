@@ -63,6 +63,7 @@ def reclassify_videos():
             unchanged += 1
     
     db.conn.commit()
+    db.refresh_channel_agg()
     
     logger.info("=" * 70)
     logger.info(" RESULTADO DA RECLASSIFICAÇÃO")
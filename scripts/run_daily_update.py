@@ -12,6 +12,7 @@ from dotenv import load_dotenv
 # Add app directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'app'))
 
+from config import Config
 from db import Database
 from youtube_client import YouTubeClient
 from collector import Collector
@@ -50,7 +51,7 @@ def main():
             return 2
         
         db = Database(db_path)
-        youtube = YouTubeClient(api_key)
+        youtube = YouTubeClient(api_key, cache=db, cache_ttl_days=Config.CACHE_TTL_DAYS)
         collector = Collector(youtube, db)
         
         # Get list of all channels
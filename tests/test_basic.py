@@ -5,7 +5,6 @@ Run with: pytest tests/test_basic.py -v
 import pytest
 import sys
 from pathlib import Path
-import isodate
 
 # Add app to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'app'))
@@ -13,6 +12,16 @@ sys.path.insert(0, str(Path(__file__).parent.parent / 'app'))
 from youtube_client import YouTubeClient
 
 
+def make_video(video_id, channel_id='test_channel', views=10, is_short=0,
+               published_at='2026-01-01T00:00:00Z', duration_seconds=600):
+    """Video dict in the shape accepted by Database.upsert_videos."""
+    return {
+        'video_id': video_id, 'channel_id': channel_id, 'title': video_id,
+        'published_at': published_at, 'duration_seconds': duration_seconds,
+        'is_short': is_short, 'is_live': 0, 'last_view_count': views
+    }
+
+
 class TestDurationParsing:
     """Test ISO 8601 duration parsing."""
     
@@ -33,6 +42,7 @@ class TestDurationParsing:
         """Test parsing of hour-based durations."""
         assert self._parse_duration('PT1H') == 3600
         assert self._parse_duration('PT1H2M10S') == 3730
+        assert self._parse_duration('P1DT1H') == 90000
     
     def test_parse_zero_duration(self):
         """Test parsing of zero/empty duration."""
@@ -42,8 +52,7 @@ class TestDurationParsing:
     def _parse_duration(duration_str):
         """Helper to parse duration."""
         try:
-            duration = isodate.parse_duration(duration_str)
-            return int(duration.total_seconds())
+            return YouTubeClient._parse_duration_seconds(duration_str)
         except:
             return 0
 
@@ -108,6 +117,40 @@ class TestQuotaEstimation:
         assert cost == 50
 
 
+class TestRateLimiter:
+    """Test the token-bucket rate limiter."""
+    
+    def test_burst_then_throttle(self, monkeypatch):
+        """Test that a burst passes without waiting and later calls are spaced out."""
+        import youtube_client
+        from youtube_client import RateLimiter
+        
+        waits = []
+        monkeypatch.setattr(youtube_client.time, 'sleep', waits.append)
+        limiter = RateLimiter(max_per_second=10, burst=3)
+        for _ in range(5):
+            limiter.wait_if_needed()
+        
+        # Burst of 3 passes untouched, then each call waits for its own token (~0.1s apart)
+        assert len(waits) == 2
+        assert waits[0] == pytest.approx(0.1, abs=0.02)
+        assert waits[1] == pytest.approx(0.2, abs=0.02)
+    
+    def test_aimd_rate_adjustment(self):
+        """Test that throttling halves the rate and successes restore it up to the cap."""
+        from youtube_client import RateLimiter
+        
+        limiter = RateLimiter(max_per_second=20, min_per_second=8, increase_every=2)
+        limiter.record_throttle()
+        assert limiter.max_per_second == 10
+        limiter.record_throttle()
+        assert limiter.max_per_second == 8
+        
+        for _ in range(30):
+            limiter.record_success()
+        assert limiter.max_per_second == 20
+
+
 class TestDatabaseIntegrity:
     """Test database constraints and integrity."""
     
@@ -156,6 +199,288 @@ class TestDatabaseIntegrity:
         
         db.close()
 
+    def test_upsert_videos_batch(self):
+        """Test that batched upsert inserts new rows and updates existing ones."""
+        from db import Database
+        
+        db = Database(':memory:')
+        db.upsert_channel('test_channel', 'Test Channel')
+        
+        videos = [make_video(f'vid{i}', views=100 * i, is_short=1 if i == 0 else 0) for i in range(3)]
+        db.upsert_videos(videos)
+        
+        videos[1]['last_view_count'] = 999
+        db.upsert_videos(videos[1:2])
+        
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM videos")
+        assert cursor.fetchone()[0] == 3
+        cursor.execute("SELECT last_view_count FROM videos WHERE video_id = 'vid1'")
+        assert cursor.fetchone()[0] == 999
+        
+        db.close()
+
+    def test_get_new_video_ids(self):
+        """Test that only unseen IDs are returned, in input order."""
+        from db import Database
+        
+        db = Database(':memory:')
+        db.upsert_channel('test_channel', 'Test Channel')
+        db.upsert_videos([make_video('old', published_at='2025-01-01T00:00:00Z')])
+        
+        new_ids = db.get_new_video_ids('test_channel', ['c', 'old', 'a', 'b'])
+        
+        assert new_ids == ['c', 'a', 'b']
+        
+        db.close()
+
+    def test_get_new_video_ids_ends_read_transaction(self, tmp_path):
+        """Test that the lookup leaves no transaction (and no stale WAL snapshot) open."""
+        from db import Database
+        
+        db_path = str(tmp_path / 'rankings.db')
+        db = Database(db_path)
+        db.upsert_channel('test_channel', 'Old Title')
+        
+        assert db.get_new_video_ids('test_channel', ['a', 'a', 'b']) == ['a', 'b']
+        assert not db.conn.in_transaction
+        
+        # A write committed by another connection must be visible right away
+        other = Database(db_path)
+        other.upsert_channel('test_channel', 'New Title')
+        other.close()
+        
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT title FROM channels WHERE channel_id = 'test_channel'")
+        assert cursor.fetchone()[0] == 'New Title'
+        
+        db.close()
+
+    def test_get_incremental_video_ids(self):
+        """Test that incremental selection merges new, recent and rotation videos."""
+        from datetime import datetime, timedelta
+        from db import Database
+        
+        db = Database(':memory:')
+        db.upsert_channel('test_channel', 'Test Channel')
+        recent_date = (datetime.now() - timedelta(days=5)).strftime('%Y-%m-%dT00:00:00Z')
+        db.upsert_videos([
+            make_video('recent', published_at=recent_date),
+            make_video('old', published_at='2020-01-01T00:00:00Z')
+        ])
+        
+        new_ids = db.get_new_video_ids('test_channel', ['new', 'recent', 'old'])
+        to_fetch = db.get_incremental_video_ids('test_channel', new_ids)
+        
+        # The older video is only included when picked by the ~10% rotation sample
+        assert {'new', 'recent'} <= set(to_fetch) <= {'new', 'recent', 'old'}
+        assert len(to_fetch) == len(set(to_fetch))
+        
+        db.close()
+
+    def test_create_snapshot_aggregates(self):
+        """Test that snapshot totals and divergence are computed from videos."""
+        from db import Database
+        from ranking import RankingEngine
+        
+        db = Database(':memory:')
+        db.upsert_channel('test_channel', 'Test Channel')
+        db.upsert_channel('empty_channel', 'Empty Channel')
+        db.upsert_videos([make_video('a', views=300, is_short=1), make_video('b', views=600)])
+        
+        stats = db.create_snapshot('test_channel', '2026-01-01', reported_channel_views=1000)
+        db.create_snapshot('empty_channel', '2026-01-01')
+        
+        assert stats == db.get_channel_stats('test_channel')
+        
+        cursor = db.conn.cursor()
+        cursor.execute("SELECT * FROM channel_snapshots WHERE channel_id = 'test_channel'")
+        row = cursor.fetchone()
+        assert (row['total_views'], row['shorts_views'], row['long_views']) == (900, 300, 600)
+        assert (row['total_videos'], row['shorts_videos'], row['long_videos']) == (2, 1, 1)
+        assert row['diff_percent'] == pytest.approx(10.0)
+        
+        cursor.execute("SELECT total_views, diff_percent FROM channel_snapshots WHERE channel_id = 'empty_channel'")
+        row = cursor.fetchone()
+        assert row['total_views'] == 0 and row['diff_percent'] is None
+        
+        db.create_snapshot('test_channel', '2026-01-02', reported_channel_views=900)
+        ranking = RankingEngine(db)
+        latest = ranking.get_channel_details('test_channel')['snapshot']
+        assert latest['snapshot_date'] == '2026-01-02'
+        assert latest['total_views'] == 900
+        assert latest['diff_percent'] == pytest.approx(0.0)
+        
+        db.upsert_channel('new_channel', 'New Channel')
+        assert ranking.get_channel_details('new_channel')['snapshot'] is None
+        
+        db.close()
+
+    def test_schema_version_and_brand_migration(self, tmp_path):
+        """Test that legacy dbs get the brand column and the schema version is recorded."""
+        import sqlite3
+        from db import Database, SCHEMA_VERSION
+        
+        db_path = str(tmp_path / 'legacy.db')
+        legacy = sqlite3.connect(db_path)
+        legacy.execute("CREATE TABLE channels (channel_id TEXT PRIMARY KEY, title TEXT NOT NULL)")
+        legacy.close()
+        
+        db = Database(db_path)
+        columns = {row[1] for row in db.conn.execute("PRAGMA table_info(channels)")}
+        assert 'brand' in columns
+        assert db.conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        db.close()
+        
+        # Reopening an up-to-date db must not fail
+        Database(db_path).close()
+
+    def test_api_cache_roundtrip(self):
+        """Test that cached API responses are stored, refreshed and expired."""
+        from db import Database
+        
+        db = Database(':memory:')
+        assert db.get_api_cache('missing') is None
+        
+        db.put_api_cache('k', 'etag1', {'items': [1]})
+        db.put_api_cache('k', 'etag2', {'items': [2]})
+        assert db.get_api_cache('k') == ('etag2', {'items': [2]})
+        
+        db.conn.execute("UPDATE yt_api_cache SET fetched_at = datetime('now', '-10 days')")
+        assert db.get_api_cache('k', max_age_days=7) is None
+        
+        db.put_api_cache('fresh', 'etag3', {'items': [3]})
+        assert db.prune_api_cache(max_age_days=7) == 1
+        assert db.get_api_cache('k', max_age_days=30) is None
+        assert db.get_api_cache('fresh') == ('etag3', {'items': [3]})
+        
+        db.close()
+
+    def test_video_snapshot_upsert(self):
+        """Test that re-snapshotting the same date updates the view count."""
+        from db import Database
+        
+        db = Database(':memory:')
+        db.upsert_channel('test_channel', 'Test Channel')
+        db.upsert_videos([make_video('vid')])
+        
+        db.save_video_snapshot('vid', 100, '2026-01-01', like_count=5)
+        db.bulk_save_video_snapshots([('vid', '2026-01-01', 150, None, None)])
+        
+        assert db.get_video_snapshot('vid', '2026-01-01') == 150
+        row = db.conn.execute("SELECT like_count FROM video_snapshots").fetchone()
+        assert row['like_count'] == 5
+        
+        db.close()
+
+    def test_global_totals_match_ranking(self):
+        """Test that SQL header totals equal the sums over the top-N ranking rows."""
+        from db import Database
+        from ranking import RankingEngine
+        
+        db = Database(':memory:')
+        for n, views in enumerate([500, 300, 100]):
+            channel_id = f'channel{n}'
+            db.upsert_channel(channel_id, f'Channel {n}')
+            db.upsert_videos([
+                make_video(f'{channel_id}_0', channel_id, views, is_short=1),
+                make_video(f'{channel_id}_1', channel_id, views)
+            ])
+        ranking = RankingEngine(db)
+        
+        for limit in (2, -1):
+            rows = ranking.get_global_ranking(limit=limit)
+            totals = ranking.get_global_totals(limit=limit)
+            for key in ('total_views', 'shorts_views', 'total_videos', 'shorts_count'):
+                assert totals[key] == sum(r[key] for r in rows)
+            # Windowed count ignores LIMIT
+            assert rows[0]['total_count'] == ranking.get_total_channels_count() == 3
+        
+        assert ranking.get_global_totals(search_query='nothing')['total_views'] == 0
+        
+        db.close()
+
+    def test_channel_agg_follows_video_writes(self):
+        """Test that the precomputed ranking aggregates track upserts, deletes and manual refreshes."""
+        from db import Database
+        from ranking import RankingEngine
+        
+        db = Database(':memory:')
+        ranking = RankingEngine(db)
+        for channel_id in ('channel_a', 'channel_b'):
+            db.upsert_channel(channel_id, channel_id)
+        
+        db.upsert_videos([make_video('a1', 'channel_a', 100), make_video('b1', 'channel_b', 50, is_short=1)])
+        db.upsert_videos([make_video('b2', 'channel_b', 200)])
+        rows = ranking.get_global_ranking()
+        assert [(r['channel_id'], r['total_views'], r['shorts_count']) for r in rows] == [
+            ('channel_b', 250, 1), ('channel_a', 100, 0)
+        ]
+        
+        # Direct writes need an explicit refresh
+        db.conn.execute("UPDATE videos SET is_short = 1 WHERE video_id = 'a1'")
+        db.conn.commit()
+        db.refresh_channel_agg()
+        assert ranking.get_global_ranking()[1]['shorts_views'] == 100
+        
+        db.delete_channel('channel_b')
+        assert [r['channel_id'] for r in ranking.get_global_ranking()] == ['channel_a']
+        
+        db.close()
+
+    def test_title_search_fts(self, tmp_path):
+        """Test that channel search matches substrings via the trigram index and stays in sync with channels."""
+        from db import Database
+        from ranking import RankingEngine
+        
+        db_path = str(tmp_path / 'search.db')
+        db = Database(db_path)
+        for n, title in enumerate(['Canal Técnico', 'Receitas da Vó', 'TV Canal', 'MrBeast Brasil']):
+            channel_id = f'channel{n}'
+            db.upsert_channel(channel_id, title)
+            db.upsert_videos([make_video(f'{channel_id}_0', channel_id, 100 * (n + 1))])
+        ranking = RankingEngine(db)
+        
+        def search(query):
+            return sorted(r['channel_id'] for r in ranking.get_global_ranking(search_query=query))
+        
+        assert search('canal') == ['channel0', 'channel2']
+        assert search('beast') == ['channel3']         # mid-word, like LIKE '%beast%'
+        assert search('TÉCN') == ['channel0']          # case-insensitive
+        assert search('al té') == ['channel0']         # one substring, across words
+        assert search('canal rec') == []
+        assert search('vó') == ['channel1']            # short term: LIKE fallback
+        assert ranking.get_total_channels_count(search_query='canal') == 2
+        
+        # Title updates and deletes are reflected by the triggers
+        db.upsert_channel('channel1', 'Canal de Receitas')
+        db.delete_channel('channel2')
+        assert search('canal') == ['channel0', 'channel1']
+        assert search('receitas') == ['channel1']
+        
+        # Word-tokenized indexes from schema v6-v8 are replaced on open
+        db.conn.executescript("""
+            DROP TABLE channels_fts;
+            CREATE VIRTUAL TABLE channels_fts USING fts5(
+                title, content='channels', content_rowid='rowid', tokenize='unicode61'
+            );
+            INSERT INTO channels_fts(channels_fts) VALUES ('rebuild');
+            PRAGMA user_version = 8;
+        """)
+        db.close()
+        db = Database(db_path)
+        assert sorted(r['channel_id'] for r in RankingEngine(db).get_global_ranking(search_query='beast')) == ['channel3']
+        
+        # Databases from before the FTS index get it rebuilt on open
+        db.conn.executescript("""
+            DROP TRIGGER channels_fts_ai; DROP TRIGGER channels_fts_ad; DROP TRIGGER channels_fts_au;
+            DROP TABLE channels_fts; PRAGMA user_version = 5;
+        """)
+        db.close()
+        db = Database(db_path)
+        assert sorted(r['channel_id'] for r in RankingEngine(db).get_global_ranking(search_query='canal')) == ['channel0', 'channel1']
+        db.close()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, '-v'])